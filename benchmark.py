@@ -0,0 +1,443 @@
+from durak import TransferDurak
+from durak import GameConfig
+from durak import runGame
+from durak import playGame
+from search import MCTS
+from search import simulatePlayout
+from search import randomPlayout
+from search import heuristicPlayout
+from search import epsilonLowestActionPlayout
+from search import treeDepth
+from search import ENDGAME_TALON
+from tournament import HybridAgent
+from parallel import parallelSearchTree
+from parallel import isFreeThreaded
+from notation import loadCorpus
+from notation import saveCorpus
+from notation import CORPUS_FILE
+import argparse
+import platform
+import random
+import json
+import time
+import sys
+
+###################################################################
+#                       Global Constants                          #
+###################################################################
+
+NUM_POSITIONS : int = 20 # number of endgame positions used for throughput measurements
+PLAYOUT_SECONDS : float = 2.0 # time spent measuring the throughput of each playout setting
+NUM_MATCH_GAMES : int = 50 # number of games played per truncation depth
+NUM_MATCH_PLAYOUTS : int = 200 # number of playouts MCTS does per move in the matches
+SEARCH_SECONDS : float = 2.0 # time given to each tree-parallel search
+
+BASELINE_FILE : str = 'benchmark_baseline.json' # where --save writes and --compare reads the suite results
+SUITE_REPEATS : int = 3 # each suite benchmark keeps its fastest of this many runs
+SUITE_SEED : int = 0 # seed of the games the suite positions are taken from
+SUITE_GAMES : int = 10 # number of recorded games the suite positions are taken from
+SUITE_PLAYOUTS : int = 100 # number of playouts per MCTS call in the suite
+REGRESSION_THRESHOLD : float = 0.2 # --compare fails if a benchmark is this much slower than its baseline
+
+CORPUS_SEEDS : int = 100 # the corpus holds one position per seed for each of CORPUS_SETTINGS
+CORPUS_SETTINGS : list[tuple[int, int]] = [(2, ENDGAME_TALON), (2, 0), (3, ENDGAME_TALON)] # (players, talon) of the corpus positions, in file order
+STRENGTH_POSITIONS : int = 50 # corpus positions used by the strength test
+STRENGTH_BUDGETS : list[int] = [10, 100, 200, 500] # MCTS budgets compared in the strength test
+STRENGTH_REFERENCE : int = 1000 # budget whose moves the strength test treats as correct
+
+DECK_SETTINGS : list[tuple[int, int, int]] = [(4, 9, 6), (4, 13, 6), (4, 6, 4), (3, 9, 6)] # (suits, ranks, hand size) compared by benchmarkDecks
+DECK_GAMES : int = 20 # heuristic self-play games per deck
+
+###################################################################
+#                       Benchmark Positions                       #
+###################################################################
+
+def endgamePosition(seed : int, talon : int = ENDGAME_TALON, num_players : int = 2) -> TransferDurak:
+    """
+    Deals a game with the given seed and plays it with chooseActionHeuristic until the endgame threshold is reached.
+
+    :param seed: seed of the random number generator used for the deal and the heuristic moves
+    :type seed: int
+    :param talon: the position returned is the first with at most this many cards in the talon
+    :type talon: int
+    :param num_players: number of players
+    :type num_players: int
+    :return: The first non-terminal position with at most talon cards in the talon, or None if the game ended before reaching one.
+    :rtype: TransferDurak
+    """
+    random.seed(seed)
+    game = TransferDurak(num_players = num_players, num_humans = 0)
+    if len(game.talon) <= talon:
+        return game
+    for step in playGame(game, lambda state: state.getCurrentPlayer().chooseActionHeuristic()):
+        if not game.isTerminal() and len(game.talon) <= talon:
+            return game
+    return None
+
+
+def buildCorpus(num_seeds : int = CORPUS_SEEDS, path : str = CORPUS_FILE) -> list[TransferDurak]:
+    """
+    Regenerates the endgame corpus: for every (players, talon) setting in CORPUS_SETTINGS, the endgamePosition of seeds 0 to num_seeds - 1.
+
+    :param num_seeds: number of seeds per setting
+    :param path: corpus file to write
+    :return: the corpus positions
+    :rtype: list[TransferDurak]
+    """
+    positions = []
+    for num_players, talon in CORPUS_SETTINGS:
+        for seed in range(num_seeds):
+            game = endgamePosition(seed, talon, num_players)
+            if game is not None:
+                positions.append(game)
+    header = (f'Endgame corpus: chooseActionHeuristic self-play positions, {num_seeds} seeds for each (players, talon) in {CORPUS_SETTINGS}.\n'
+              'Written by python benchmark.py --build-corpus. Read with notation.loadCorpus.')
+    saveCorpus(positions, path, header)
+    return positions
+
+
+def corpusPositions(num_positions : int, num_players : int = 2) -> list[TransferDurak]:
+    """
+    Returns the first num_positions positions of the endgame corpus with num_players players.
+
+    :param num_positions: number of positions
+    :param num_players: number of players
+    :rtype: list[TransferDurak]
+    """
+    return [game for game in loadCorpus() if len(game.players) == num_players][:num_positions]
+
+###################################################################
+#                    Playout Truncation Benchmark                 #
+###################################################################
+
+def playoutsPerSecond(positions : list[TransferDurak], max_depth, duration : float = PLAYOUT_SECONDS, policy = None) -> float:
+    """
+    Measures how many playouts simulatePlayout completes per second, cycling through the given positions.
+
+    :param positions: positions to start playouts from
+    :type positions: list[TransferDurak]
+    :param max_depth: playout depth passed to simulatePlayout (None for full-length playouts)
+    :param duration: number of seconds to measure for
+    :type duration: float
+    :param policy: playout policy passed to simulatePlayout (None for chooseActionHeuristic)
+    :return: playouts per second
+    :rtype: float
+    """
+    num_playouts = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        simulatePlayout(positions[num_playouts % len(positions)], max_depth = max_depth, policy = policy)
+        num_playouts += 1
+    return num_playouts / (time.perf_counter() - start)
+
+
+def truncatedVsFull(playout_depth, num_iterations, num_games, seed : int = 0) -> float:
+    """
+    Plays hybrid agents against each other, where one truncates its playouts at playout_depth and the other plays them to the end.
+    Seats alternate every game so that neither agent benefits from moving first.
+
+    :param playout_depth: playout depth of the truncated agent
+    :param num_iterations: number of playouts MCTS does per move for both agents
+    :param num_games: number of games to play
+    :param seed: seed of the first game. Game i uses seed + i
+    :type seed: int
+    :return: The win rate of the truncated agent
+    :rtype: float
+    """
+    wins = 0
+    for iter in range(num_games):
+        random.seed(seed + iter)
+        game = TransferDurak(num_players = 2, num_humans = 0)
+        truncated_player = iter % 2 # alternate seats
+        truncated = HybridAgent(num_iterations, playout_depth = playout_depth)
+        full = HybridAgent(num_iterations)
+        runGame(game, {truncated_player: truncated.chooseAction, 1 - truncated_player: full.chooseAction})
+
+        if game.player_numbers[0] != truncated_player:
+            wins += 1
+    return wins / num_games
+
+
+def benchmarkTruncation(depths : list, num_games : int = NUM_MATCH_GAMES, num_iterations : int = NUM_MATCH_PLAYOUTS):
+    """
+    Prints playouts/sec for full-length and truncated playouts, and the win rate of each truncated setting against full-length playouts.
+
+    :param depths: truncation depths to compare against full-length playouts
+    :type depths: list
+    :param num_games: number of games played per depth
+    :type num_games: int
+    :param num_iterations: number of playouts MCTS does per move
+    :type num_iterations: int
+    """
+    positions = corpusPositions(NUM_POSITIONS)
+    full_rate = playoutsPerSecond(positions, max_depth = None)
+    print(f'full-length playouts: {full_rate:.0f} playouts/sec')
+    for depth in depths:
+        rate = playoutsPerSecond(positions, max_depth = depth)
+        win_rate = truncatedVsFull(depth, num_iterations, num_games)
+        print(f'depth {depth}: {rate:.0f} playouts/sec ({rate / full_rate:.2f}x), win rate vs full-length: {win_rate:.2f}')
+
+
+###################################################################
+#                   Tree Parallelism Benchmark                    #
+###################################################################
+
+def benchmarkThreads(thread_counts : list[int], duration : float = SEARCH_SECONDS):
+    """
+    Prints iterations/sec and tree depth of parallelSearchTree for each thread count, averaged over a few endgame positions.
+
+    :param thread_counts: numbers of threads to compare
+    :type thread_counts: list[int]
+    :param duration: time given to each search
+    :type duration: float
+    """
+    positions = corpusPositions(5)
+    print(f'free-threaded interpreter: {isFreeThreaded()}')
+    for num_threads in thread_counts:
+        iterations = 0
+        depth = 0
+        for game in positions:
+            root = parallelSearchTree(game, num_threads = num_threads, time_limit = duration)
+            iterations += root.N
+            depth += treeDepth(root)
+        print(f'{num_threads} threads: {iterations / (duration * len(positions)):.0f} iterations/sec, mean tree depth {depth / len(positions):.1f}')
+
+
+###################################################################
+#                 Benchmark Suite and Baselines                   #
+###################################################################
+
+def recordedGames(num_games : int, seed : int = SUITE_SEED) -> list[tuple]:
+    """
+    Plays seeded chooseActionHeuristic self-play games and records them.
+
+    :param num_games: number of games to record
+    :type num_games: int
+    :param seed: seed of the first game. Game i uses seed + i
+    :type seed: int
+    :return: list of (copy of the dealt game, list of actions played, list of copies of every non-terminal position)
+    :rtype: list[tuple]
+    """
+    games = []
+    for iter in range(num_games):
+        random.seed(seed + iter)
+        game = TransferDurak(num_players = 2, num_humans = 0)
+        start = TransferDurak(game)
+        positions = []
+
+        def agent(state : TransferDurak) -> tuple:
+            positions.append(TransferDurak(state))
+            return state.getCurrentPlayer().chooseActionHeuristic()
+
+        trace = []
+        runGame(game, agent, trace = trace)
+        games.append((start, [a for player, a in trace], positions))
+    return games
+
+
+def replayGame(start : TransferDurak, actions : list[tuple]) -> int:
+    """
+    Replays a recorded game from a copy of its start through game.play (like every game loop) and returns the number of actions played.
+    """
+    game = TransferDurak(start)
+    for a in actions:
+        game.play(a)
+    return len(actions)
+
+
+def measureThroughput(f, inputs : list, loops : int = 1, repeats : int = SUITE_REPEATS, seed : int = SUITE_SEED) -> float:
+    """
+    Calls f on every input, loops times over, and returns the operations per second of the fastest of repeats runs.
+    f may return the number of operations it performed (e.g. transitions in a replayed game); otherwise each call counts as one.
+    Every run does the same work from the same seed, so runs only differ by timing noise, which the best-of-repeats filters out.
+
+    :param f: function of one input
+    :param inputs: inputs to call f on
+    :type inputs: list
+    :param loops: number of passes over inputs per run
+    :type loops: int
+    :param repeats: number of runs
+    :type repeats: int
+    :param seed: seed of the random number generator at the start of each run
+    :type seed: int
+    :rtype: float
+    """
+    best = 0.0
+    for r in range(repeats):
+        random.seed(seed)
+        operations = 0
+        start = time.perf_counter()
+        for l in range(loops):
+            for x in inputs:
+                result = f(x)
+                operations += result if type(result) is int else 1
+        best = max(best, operations / (time.perf_counter() - start))
+    return best
+
+
+def runSuite() -> dict[str, float]:
+    """
+    Measures the throughput of the engine and search hot paths at fixed seeds.
+
+    :return: dictionary mapping benchmark names to operations per second
+    :rtype: dict[str, float]
+    """
+    games = recordedGames(SUITE_GAMES)
+    positions = [p for start, actions, game_positions in games for p in game_positions[::5]] # positions from every stage of the game
+    endgames = corpusPositions(NUM_POSITIONS)
+    endgames_3p = corpusPositions(5, num_players = 3) # playouts with 3 or more players can cycle, so this also checks they are cut off
+
+    # name: (function, inputs, passes over the inputs per run)
+    benchmarks = {
+        'transition': (lambda g: replayGame(g[0], g[1]), games, 20),
+        'actions': (lambda p: p.actions(), positions, 50),
+        'sampleBelief': (lambda p: p.sampleBelief(), positions, 2),
+        'clone': (lambda p: TransferDurak(p), positions, 2),
+        'randomPlayout': (randomPlayout, endgames, 2),
+        'heuristicPlayout': (heuristicPlayout, endgames, 2),
+        'epsilonLowestActionPlayout': (epsilonLowestActionPlayout, endgames, 2),
+        'MCTS iterations': (lambda p: (MCTS(p, num_iterations = SUITE_PLAYOUTS), SUITE_PLAYOUTS)[1], endgames[:5], 1),
+        'MCTS iterations (3 players)': (lambda p: (MCTS(p, num_iterations = SUITE_PLAYOUTS), SUITE_PLAYOUTS)[1], endgames_3p, 1),
+    }
+    results = {}
+    for name, (f, inputs, loops) in benchmarks.items():
+        results[name] = measureThroughput(f, inputs, loops)
+        print(f'{name:<28} {results[name]:>12.1f} /s')
+    return results
+
+
+def saveBaseline(results : dict[str, float], path : str = BASELINE_FILE):
+    baseline = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent = 2)
+
+
+def compareToBaseline(results : dict[str, float], path : str = BASELINE_FILE, threshold : float = REGRESSION_THRESHOLD) -> bool:
+    """
+    Prints each benchmark's throughput relative to the saved baseline.
+
+    :param results: results of runSuite
+    :type results: dict[str, float]
+    :param path: baseline file written by saveBaseline
+    :type path: str
+    :param threshold: largest allowed relative slowdown
+    :type threshold: float
+    :return: False if any benchmark regressed by more than threshold
+    :rtype: bool
+    """
+    with open(path, 'r') as file:
+        baseline = json.load(file)['results']
+    passed = True
+    for name, rate in baseline.items():
+        if name not in results:
+            continue
+        ratio = results[name] / rate
+        regressed = ratio < 1 - threshold
+        passed = passed and not regressed
+        print(f'{name:<28} {ratio:>6.2f}x baseline{"  REGRESSION" if regressed else ""}')
+    return passed
+
+
+###################################################################
+#                       Corpus Strength Test                      #
+###################################################################
+
+def strengthTest(budgets : list[int] = STRENGTH_BUDGETS, reference : int = STRENGTH_REFERENCE, num_positions : int = STRENGTH_POSITIONS,
+                 seed : int = SUITE_SEED) -> dict:
+    """
+    Compares the moves chosen on corpus positions under fixed MCTS budgets (and by chooseActionHeuristic) with the moves MCTS chooses with the
+    reference budget. Every search is seeded, so a rerun on the same engine reproduces the table, and engine changes that are not meant to
+    change play can be checked with it.
+
+    :param budgets: MCTS budgets to test
+    :param reference: budget of the reference moves
+    :param num_positions: number of 2 player corpus positions to use (positions with a single legal action are skipped)
+    :param seed: seed of every search
+    :return: dictionary mapping each budget (and 'heuristic') to the fraction of positions where it chose the reference move
+    :rtype: dict
+    """
+    positions = [p for p in corpusPositions(num_positions) if len(p.actions()) > 1]
+
+    def choose(game, budget):
+        random.seed(seed)
+        if budget == 'heuristic':
+            return game.getCurrentPlayer().chooseActionHeuristic()
+        return MCTS(game, num_iterations = budget)
+
+    reference_moves = [choose(p, reference) for p in positions]
+    agreement = {}
+    for budget in budgets + ['heuristic']:
+        same = sum(choose(p, budget) == a for p, a in zip(positions, reference_moves))
+        agreement[budget] = same / len(positions)
+        print(f'{str(budget):<10} agrees with MCTS{reference} on {agreement[budget]:.3f} of {len(positions)} positions')
+    return agreement
+
+
+###################################################################
+#                        Deck Size Sweep                          #
+###################################################################
+
+def benchmarkDecks(settings : list[tuple[int, int, int]] = DECK_SETTINGS, num_games : int = DECK_GAMES, num_iterations : int = SUITE_PLAYOUTS,
+                   seed : int = SUITE_SEED) -> dict:
+    """
+    Plays 2 player chooseActionHeuristic self-play games with every deck setting in one process (each setting builds its GameConfig tables once),
+    and times an MCTS search from the first position of each game.
+
+    :param settings: (suits, ranks, hand size) of the decks to compare
+    :param num_games: games per deck. Game i is dealt with seed + i
+    :param num_iterations: playouts of each MCTS search
+    :param seed: seed of the first game
+    :return: dictionary mapping each setting to (games/sec, mean plies per game, MCTS iterations/sec)
+    :rtype: dict
+    """
+    results = {}
+    for suits, ranks, hand_size in settings:
+        config = GameConfig.get(suits, ranks, hand_size)
+        plies = 0
+        play_seconds = 0.0
+        search_seconds = 0.0
+        for i in range(num_games):
+            random.seed(seed + i)
+            game = TransferDurak(num_players = 2, num_humans = 0, config = config)
+            start = time.perf_counter()
+            MCTS(game, num_iterations = num_iterations)
+            search_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            plies += runGame(game, lambda state: state.getCurrentPlayer().chooseActionHeuristic())
+            play_seconds += time.perf_counter() - start
+        results[(suits, ranks, hand_size)] = (num_games / play_seconds, plies / num_games, num_games * num_iterations / search_seconds)
+        print(f'{suits} suits x {ranks} ranks, hands of {hand_size}: {num_games / play_seconds:.1f} games/sec, {plies / num_games:.1f} plies/game, '
+              f'{num_games * num_iterations / search_seconds:.0f} MCTS iterations/sec')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Durak engine and search benchmarks.')
+    parser.add_argument('--save', action = 'store_true', help = f'save the suite results as the baseline ({BASELINE_FILE})')
+    parser.add_argument('--compare', action = 'store_true', help = 'compare the suite results to the baseline and exit with status 1 on a regression')
+    parser.add_argument('--threshold', type = float, default = REGRESSION_THRESHOLD, help = 'largest allowed relative slowdown for --compare')
+    parser.add_argument('--experiments', action = 'store_true', help = 'run the playout truncation and thread scaling experiments instead of the suite')
+    parser.add_argument('--strength', action = 'store_true', help = 'run the move choice strength test on the endgame corpus instead of the suite')
+    parser.add_argument('--build-corpus', action = 'store_true', help = f'regenerate the endgame corpus ({CORPUS_FILE})')
+    parser.add_argument('--decks', action = 'store_true', help = 'compare game and search throughput across the DECK_SETTINGS deck sizes instead of the suite')
+    args = parser.parse_args()
+
+    if args.build_corpus:
+        print(f'{len(buildCorpus())} positions written to {CORPUS_FILE}')
+        sys.exit(0)
+    if args.strength:
+        strengthTest()
+        sys.exit(0)
+    if args.decks:
+        benchmarkDecks()
+        sys.exit(0)
+    if args.experiments:
+        benchmarkTruncation([2, 4, 8, 16])
+        benchmarkThreads([1, 2, 4, 8])
+        sys.exit(0)
+
+    results = runSuite()
+    if args.save:
+        saveBaseline(results)
+    if args.compare and not compareToBaseline(results, threshold = args.threshold):
+        sys.exit(1)
@@ -0,0 +1,296 @@
+from durak import TransferDurak
+from durak import HumanPlayer
+from durak import GameConfig
+from durak import DEFAULT_CONFIG
+from durak import STATE_MAGIC, STATE_FORMAT_VERSION
+import itertools
+import struct
+import argparse
+import random
+
+###################################################################
+#                     Suit Canonicalization                       #
+###################################################################
+
+# The rules only ask whether two cards share a suit and whether a suit is trump, so relabelling the suits of a position
+# (keeping the trump the trump) gives a strategically identical position. Canonicalization picks one labelling per class of
+# such positions: the trump becomes suit 0 and the other suits are ordered by where their cards are.
+# With 4 suits this merges up to 24 labellings (6 for a fixed trump suit) into one cache entry.
+
+def suitSignature(game : TransferDurak, suit : int) -> tuple:
+    """
+    Describes where every card of suit is, in terms that do not depend on how the suits are labelled.
+    Two suits with the same signature can be swapped without changing the position.
+
+    :param game: position
+    :type game: TransferDurak
+    :param suit: suit to describe
+    :type suit: int
+    :rtype: tuple
+    """
+    location = {card: ('talon', i) for i, card in enumerate(game.talon)}
+    for name, cards in (('attack', game.attack_cards), ('defense', game.defense_cards)):
+        for i, card in enumerate(cards):
+            location[card] = (name, i)
+    for k, p in enumerate(game.players):
+        for card in p.hand:
+            location[card] = ('hand', k)
+    last_table = {card: i for i, card in enumerate(list(game.last_attack) + list(game.last_defense))}
+    last_move = [] if game.last_move is None else list(game.last_move[1])
+    signature = []
+    for rank in range(game.config.ranks):
+        card = game.config.card(rank, suit)
+        beliefs = tuple((k, j) for k, p in enumerate(game.players) for j, belief in enumerate(p.hand_beliefs) if card in belief)
+        unseen = tuple(k for k, p in enumerate(game.players) if card in p.talon_belief)
+        played = last_move.index(card) if card in last_move else -1
+        signature.append((location.get(card, ('discard',)), last_table.get(card, -1), played, beliefs, unseen))
+    return tuple(signature)
+
+
+def canonicalPermutation(game : TransferDurak) -> list[int]:
+    """
+    :param game: position
+    :type game: TransferDurak
+    :return: perm with perm[suit] the canonical label of suit: 0 for the trump, then the other suits in signature order
+    :rtype: list[int]
+    """
+    others = sorted((s for s in range(game.config.suits) if s != game.trump), key = lambda s: suitSignature(game, s))
+    perm = [0] * game.config.suits
+    for label, suit in enumerate([game.trump] + others):
+        perm[suit] = label
+    return perm
+
+
+def relabelCard(card, perm : list[int], config : GameConfig = DEFAULT_CONFIG):
+    return config.card(card.rank, perm[card.suit])
+
+
+def relabelAction(a : tuple, perm : list[int], config : GameConfig = DEFAULT_CONFIG) -> tuple:
+    """
+    :param a: action of a position
+    :param perm: suit relabelling applied to the position
+    :param config: configuration of the position
+    :return: the same action in the relabelled position
+    :rtype: tuple
+    """
+    return (a[0], tuple(relabelCard(card, perm, config) for card in a[1]))
+
+
+def inversePermutation(perm : list[int]) -> list[int]:
+    inverse = [0] * len(perm)
+    for suit, label in enumerate(perm):
+        inverse[label] = suit
+    return inverse
+
+
+def relabelSuits(game : TransferDurak, perm : list[int], sort_hands : bool = False) -> TransferDurak:
+    """
+    Returns a copy of game with every card's suit s replaced by perm[s].
+
+    :param game: position to relabel. It is not modified.
+    :type game: TransferDurak
+    :param perm: suit relabelling
+    :type perm: list[int]
+    :param sort_hands: also sort every hand (hand order does not matter to the rules, only to the order of actions())
+    :rtype: TransferDurak
+    """
+    copy = TransferDurak.fromBytes(game.toBytes())
+    relabel = lambda cards: [relabelCard(card, perm, game.config) for card in cards]
+    copy.trump = perm[game.trump]
+    copy.talon = relabel(copy.talon)
+    copy.discard = set(relabel(copy.discard))
+    copy.attack_cards = relabel(copy.attack_cards)
+    copy.defense_cards = relabel(copy.defense_cards)
+    copy.last_attack = relabel(copy.last_attack)
+    copy.last_defense = relabel(copy.last_defense)
+    if copy.last_move is not None:
+        copy.last_move = relabelAction(copy.last_move, perm, game.config)
+    for p in copy.players:
+        p.hand = relabel(p.hand)
+        if sort_hands:
+            p.hand.sort(key = lambda c: (c.suit, c.rank))
+        p.hand_beliefs = [set(relabel(belief)) for belief in p.hand_beliefs]
+        p.talon_belief = set(relabel(p.talon_belief))
+    return copy
+
+
+def canonicalize(game : TransferDurak) -> tuple[TransferDurak, list[int]]:
+    """
+    Maps game to the canonical member of its suit isomorphism class (with sorted hands).
+
+    :param game: position. It is not modified.
+    :type game: TransferDurak
+    :return: the canonical position, and the permutation that produced it (pass it to relabelAction to translate actions,
+             and its inverse to translate actions of the canonical position back)
+    :rtype: tuple[TransferDurak, list[int]]
+    """
+    perm = canonicalPermutation(game)
+    return relabelSuits(game, perm, sort_hands = True), perm
+
+
+def canonicalKey(game : TransferDurak, perm : list[int] = None) -> bytes:
+    """
+    Hashable key shared by all positions that differ only by suit labelling and hand order.
+    It is the toBytes encoding of the canonical position, written straight from game's card ids under perm without building that position.
+
+    :param game: position
+    :type game: TransferDurak
+    :param perm: canonicalPermutation(game) if the caller already has it, or None to compute it
+    :rtype: bytes
+    """
+    if perm is None:
+        perm = canonicalPermutation(game)
+    config = game.config
+    ids = [perm[card.suit] * config.ranks + card.rank for card in config.cards] # ids[cardId(card)] is the id of card after relabelling
+
+    def cards(out, cards, sort = False):
+        relabelled = [ids[config.cardId(card)] for card in cards]
+        out.append(len(relabelled))
+        out += bytes(sorted(relabelled) if sort else relabelled)
+
+    def mask(out, cards):
+        bits = 0
+        for card in cards:
+            bits |= 1 << ids[config.cardId(card)]
+        out += bits.to_bytes(config.mask_bytes, 'little')
+
+    out = bytearray(STATE_MAGIC)
+    flags = (1 if game.is_attacker_move else 0) | (2 if game.defender_eating else 0)
+    out += bytes((STATE_FORMAT_VERSION, config.suits, config.ranks, config.hand_size, len(game.players), flags, game.attacker_pos, game.defender_pos, perm[game.trump]))
+    out += struct.pack('<Hb', game.round, -1 if game.last_player is None else game.last_player)
+    out += bytes(game.player_numbers)
+    for p in game.players:
+        out.append(1 if type(p) is HumanPlayer else 0)
+        cards(out, p.hand, sort = True)
+        for belief in p.hand_beliefs:
+            mask(out, belief)
+        mask(out, p.talon_belief)
+    cards(out, game.talon)
+    mask(out, game.discard)
+    for table in (game.attack_cards, game.defense_cards, game.last_attack, game.last_defense):
+        cards(out, table)
+    if game.last_move is None:
+        out.append(0)
+    else:
+        out.append(ord(game.last_move[0]))
+        cards(out, game.last_move[1])
+    return bytes(out)
+
+###################################################################
+#                         Position Cache                          #
+###################################################################
+
+class PositionCache:
+    def __init__(self):
+        """
+        Cache of per-action results (visit counts, values, ...) keyed by canonical position,
+        so that isomorphic positions share one entry. Actions are stored in the canonical labelling and translated on the way in and out.
+        Position values (e.g. evaluator scores, see search.MCTS evaluator_cache) do not name any suit and are stored as they are.
+        """
+        self.entries = {}
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, game : TransferDurak) -> dict:
+        """
+        :param game: position to look up
+        :return: dictionary mapping the actions of game (in its own labelling) to the cached results, or None on a miss
+        :rtype: dict
+        """
+        perm = canonicalPermutation(game)
+        entry = self.entries.get(canonicalKey(game, perm))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        inverse = inversePermutation(perm)
+        return {relabelAction(a, inverse, game.config): value for a, value in entry.items()}
+
+
+    def put(self, game : TransferDurak, results : dict):
+        """
+        :param game: position the results belong to
+        :param results: dictionary mapping actions of game to results
+        """
+        perm = canonicalPermutation(game)
+        self.entries[canonicalKey(game, perm)] = {relabelAction(a, perm, game.config): value for a, value in results.items()}
+
+
+    def getValue(self, game : TransferDurak, key : bytes = None):
+        """
+        :param game: position to look up
+        :param key: canonicalKey(game) if the caller already has it, or None to compute it
+        :return: the value cached for game or any relabelling of it, or None on a miss
+        """
+        value = self.values.get(canonicalKey(game) if key is None else key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+
+    def putValue(self, game : TransferDurak, value, key : bytes = None):
+        """
+        :param game: position the value belongs to
+        :param value: value of game, which must not depend on how the suits are labelled
+        :param key: canonicalKey(game) if the caller already has it, or None to compute it
+        """
+        self.values[canonicalKey(game) if key is None else key] = value
+
+
+    def __len__(self) -> int:
+        return len(self.entries) + len(self.values)
+
+###################################################################
+#                          Self Check                             #
+###################################################################
+
+def checkInvariance(num_games : int = 10, seed : int = 0) -> int:
+    """
+    Plays random games and checks, at every position, that every relabelling of the non-trump suits has the same canonicalKey,
+    and that relabelled actions are legal and lead to positions with the same key.
+
+    :param num_games: number of games, with 2 to 4 players
+    :param seed: seed of the deals and of the random moves
+    :raises AssertionError: at the first position where canonicalization is not invariant
+    :return: number of relabelled positions checked
+    :rtype: int
+    """
+    rng = random.Random(seed)
+    checked = 0
+    for i in range(num_games):
+        random.seed(seed + i)
+        game = TransferDurak(num_players = 2 + i % 3, num_humans = 0)
+        while not game.isTerminal():
+            key = canonicalKey(game)
+            actions = game.actions()
+            others = [s for s in range(game.config.suits) if s != game.trump]
+            for labels in itertools.permutations(others):
+                perm = list(range(game.config.suits))
+                for suit, label in zip(others, labels):
+                    perm[suit] = label
+                relabelled = relabelSuits(game, perm)
+                assert canonicalKey(relabelled) == key, f'game {i}: relabelling {perm} changes the key'
+                assert relabelSuits(relabelled, canonicalPermutation(relabelled), sort_hands = True).toBytes() == key, f'game {i}: the key is not the encoding of the canonical position'
+                a = rng.choice(actions)
+                b = relabelAction(a, perm, game.config)
+                assert b in relabelled.actions(), f'game {i}: {b} is not legal after relabelling {perm}'
+                after, relabelled_after = TransferDurak(game), TransferDurak(relabelled)
+                after.play(a)
+                relabelled_after.play(b)
+                assert canonicalKey(after) == canonicalKey(relabelled_after), f'game {i}: {a} and {b} lead to different positions'
+                checked += 1
+            game.play(rng.choice(actions))
+    return checked
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Checks that canonicalKey does not depend on how the non-trump suits are labelled.')
+    parser.add_argument('--games', type = int, default = 10, help = 'random games to check')
+    parser.add_argument('--seed', type = int, default = 0, help = 'seed of the games')
+    args = parser.parse_args()
+
+    print(f'{checkInvariance(args.games, args.seed)} relabelled positions checked, canonicalization is invariant')
@@ -1,4 +1,6 @@
 import random
+import struct
+import time
 import os
 import copy
 
@@ -6,11 +8,17 @@ import copy
 #                         Global Constants                        #
 ###################################################################
 
-# parameterize number of suits
+# parameterize number of suits (defaults of GameConfig, see DEFAULT_CONFIG)
 SUITS : int = 4 # spade, club, heart, diamond
 RANKS : int = 9 # 9 corresponds to removing 2 through 5 (the way Durak is traditionally played)
 HAND_SIZE : int = 6 # number of cards the player is supposed to draw to during early game
 
+# chooseActionHeuristic
+TALON_TOLERANCE : int = 4 # while the talon has more cards than this, the heuristic avoids playing trumps
+EPSILON : float = 0.1 # probability that the heuristic plays a trump anyway
+
+# move generation
+
 # printing normal durak game        # Number of Suit
 SPADE : str = '\u2660'              # 0
 CLUB: str = '\u2663'                # 1
@@ -27,31 +35,53 @@ RESET_COLOR : str = '\033[0m'
 # controls whether all player hands are displayed
 OMNISCIENT_GAME : bool = False
 
-# lists used for printing the Card class when SUITS == 4 and RANKS in [9, 13]
+# binary state format written by TransferDurak.toBytes
+STATE_MAGIC : bytes = b'DK'
+STATE_FORMAT_VERSION : int = 2 # increase whenever the layout written by toBytes changes
+
+# lists used for printing the Card class when there are 4 suits and RANKMAPS has the number of ranks
 SUITMAP = [SPADE, CLUB, HEART, DIAMOND]
 COLORMAP = [BLUE_COLOR, BLUE_COLOR, RED_COLOR, RED_COLOR]
+RANKMAPS : dict[int, list[str]] = {
+    13: ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A'], # full deck, convention is ace is highest number
+    9: ['6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A'], # remove 2,3,4,5
+}
 
 ###################################################################
 #                           Card Class                            #
 ###################################################################
 
+def renderCard(rank : int, suit : int, suits : int, ranks : int) -> tuple[str, int]:
+    """
+    Text of a card, and the number of characters it takes on screen (without the color codes).
+
+    :param rank: rank of the card
+    :param suit: suit of the card
+    :param suits: number of suits of the deck
+    :param ranks: number of ranks of the deck
+    :rtype: tuple[str, int]
+    """
+    if suits == 4 and ranks in RANKMAPS:
+        name = RANKMAPS[ranks][rank]
+        return f'{COLORMAP[suit]}{name}{SUITMAP[suit]}{RESET_COLOR}', len(name) + 1
+    return f'({rank},{suit})', (rank // 10) + (suit // 10) + 2 + 3 # +2 is for base length, +3 is for tuple formatting, others are for having more than one digit in rank or suit
+
+
 # Card class used as backbone of Durak game
 class Card:
+    # rendering filled in by the GameConfig that owns the card. Cards built directly are rendered for the default deck.
+    text : str = None
+    length : int = None
+
     def __init__(self, rank, suit):
         self.rank = rank
         self.suit = suit
 
 
     def __str__(self) -> str:
-        # full deck of 13 ranks
-        if SUITS == 4 and RANKS == 13:
-            rankmap = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A'] # convention is ace is highest number
-            return f'{COLORMAP[self.suit]}{rankmap[self.rank]}{SUITMAP[self.suit]}{RESET_COLOR}'
-        # remove 2,3,4,5
-        if SUITS == 4 and RANKS == 9:
-            rankmap = ['6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A'] # convention is ace is highest number
-            return f'{COLORMAP[self.suit]}{rankmap[self.rank]}{SUITMAP[self.suit]}{RESET_COLOR}'
-        return f'({self.rank},{self.suit})'
+        if self.text is None:
+            return renderCard(self.rank, self.suit, SUITS, RANKS)[0]
+        return self.text
 
 
     def __repr__(self) -> str:
@@ -67,18 +97,138 @@ class Card:
 
 
     def strLen(self):
-        if SUITS == 4 and RANKS == 9:
-            if self.rank == 4: # index of 10 in rankmap
-                return 3
-            else:
-                return 2
-        if SUITS == 4 and RANKS == 13:
-            if self.rank == 8: # index of 10 in rankmap
-                return 3
-            else:
-                return 2
-        else:
-            return (self.rank // 10) + (self.suit // 10) + 2 + 3 # +2 is for base length, +3 is for tuple formatting, others are for having more than one digit in rank or suit
+        if self.length is None:
+            return renderCard(self.rank, self.suit, SUITS, RANKS)[1]
+        return self.length
+
+###################################################################
+#                       Game Configuration                        #
+###################################################################
+
+def attackerOffsets(num_players : int) -> tuple[int, ...]:
+    """
+    Seats allowed to attack, relative to the defender, in the order they may attack.
+
+    :param num_players: number of players still in the game
+    :type num_players: int
+    :rtype: tuple[int, ...]
+    """
+    if num_players < 3:
+        return (1,) # only one possible attacker
+    if num_players == 3:
+        return (-1, 1)
+    if num_players == 4:
+        return (-1, 1, 2) # other 3 players attack right, left, across (from defender)
+    return (1, -1) # >= 5 players: attackers to either side of the player
+
+
+def buildAttackerTable(num_players : int) -> list[tuple[int, ...]]:
+    """
+    :return: for every defender position, the positions allowed to attack it, in order
+    :rtype: list[tuple[int, ...]]
+    """
+    return [tuple((defender + offset) % num_players for offset in attackerOffsets(num_players)) for defender in range(num_players)]
+
+
+class GameConfig:
+    configs = {} # (suits, ranks, hand_size) -> GameConfig, so that every game with the same settings shares one set of tables
+
+    def __init__(self, suits : int = SUITS, ranks : int = RANKS, hand_size : int = HAND_SIZE):
+        """
+        Immutable deck and dealing settings of a game, with the tables derived from them. The tables are built once
+        and shared by every game using the configuration; use GameConfig.get to reuse the configuration of earlier games.
+
+        :param suits: number of suits
+        :type suits: int
+        :param ranks: number of ranks per suit
+        :type ranks: int
+        :param hand_size: number of cards dealt to every player, and drawn up to after every round
+        :type hand_size: int
+        """
+        if suits < 1 or ranks < 1 or hand_size < 1 or suits * ranks > 255:
+            raise ValueError(f'unsupported deck of {suits} suits, {ranks} ranks and hands of {hand_size}')
+        set_field = lambda name, value: object.__setattr__(self, name, value)
+        set_field('suits', suits)
+        set_field('ranks', ranks)
+        set_field('hand_size', hand_size)
+        set_field('num_cards', suits * ranks)
+        set_field('max_players', suits * ranks // hand_size) # most players the deck can deal full hands to
+
+        # cards[i] is the card with id i = suit * ranks + rank. Games built with this configuration only hold these objects (or copies of them).
+        cards = []
+        for suit in range(suits):
+            for rank in range(ranks):
+                card = Card(rank, suit)
+                card.text, card.length = renderCard(rank, suit, suits, ranks)
+                cards.append(card)
+        set_field('cards', tuple(cards))
+        set_field('mask_bytes', (suits * ranks + 7) // 8) # size of a set of cards encoded as a bit mask
+
+        # beats_masks[trump][i]: bit mask (by card id) of the cards that card i beats when trump is the trump suit (the rule of TransferDurak.beatsCard)
+        beats = lambda d, c, trump: (d.suit == trump and (c.suit != trump or d.rank > c.rank)) or (d.suit == c.suit and d.rank > c.rank)
+        set_field('beats_masks', tuple(tuple(sum(1 << j for j, c in enumerate(cards) if beats(d, c, trump)) for d in cards) for trump in range(suits)))
+
+        # subset_table[k]: index lists of the subsets of k items, in getAllSubsets order (cards of one rank number at most suits)
+        set_field('subset_table', tuple(tuple(tuple(subset) for subset in getAllSubsets(list(range(k)))) for k in range(suits + 1)))
+
+        # attacker_table[n][d]: positions (indices in TransferDurak.players) allowed to attack position d when n players are left, in order
+        # next_attacker[n][d][a]: the attacker after a in attacker_table[n][d] (missing if a is the last one)
+        attacker_table = [[]] + [buildAttackerTable(n) for n in range(1, max(self.max_players, 2) + 1)]
+        set_field('attacker_table', attacker_table)
+        set_field('next_attacker', [[{a: b for a, b in zip(attackers, attackers[1:])} for attackers in table] for table in attacker_table])
+
+
+    @classmethod
+    def get(cls, suits : int = SUITS, ranks : int = RANKS, hand_size : int = HAND_SIZE):
+        """
+        Returns the shared configuration with these settings, building it the first time.
+
+        :rtype: GameConfig
+        """
+        key = (suits, ranks, hand_size)
+        if key not in cls.configs:
+            cls.configs[key] = cls(suits, ranks, hand_size)
+        return cls.configs[key]
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError('GameConfig is immutable, use GameConfig.get for other settings')
+
+
+    def __reduce__(self):
+        # unpickled configurations (e.g. in worker processes) are the shared instance of their settings
+        return (GameConfig.get, (self.suits, self.ranks, self.hand_size))
+
+
+    def __repr__(self) -> str:
+        return f'GameConfig(suits = {self.suits}, ranks = {self.ranks}, hand_size = {self.hand_size})'
+
+
+    def cardId(self, card : Card) -> int:
+        # index of card in cards, used as its byte and bit position by the binary encoding
+        return card.suit * self.ranks + card.rank
+
+
+    def card(self, rank : int, suit : int) -> Card:
+        return self.cards[suit * self.ranks + rank]
+
+
+    def bits(self, cards) -> int:
+        # the set of cards as an integer bit mask, bit cardId(card) set for every card
+        mask = 0
+        for card in cards:
+            mask |= 1 << self.cardId(card)
+        return mask
+
+
+    def subsets(self, items : list) -> list[list]:
+        """
+        Same as getAllSubsets(items), read from subset_table when there are at most suits items
+        (sampled belief states can hold a card twice, so a hand may have more cards of one rank than there are suits).
+        """
+        if len(items) >= len(self.subset_table):
+            return getAllSubsets(items)
+        return [[items[i] for i in subset] for subset in self.subset_table[len(items)]]
 
 ###################################################################
 #                         Durak Classes                           #
@@ -86,7 +236,7 @@ class Card:
 
 
 class TransferDurak:
-    def __init__(self, other = None, num_players: int = 2, num_humans = 1):
+    def __init__(self, other = None, num_players: int = 2, num_humans = 1, config : GameConfig = None):
         """
         Docstring for __init__
         
@@ -94,13 +244,19 @@ class TransferDurak:
         :param other: pass other if you want to copy the data of other. The new TransferDurak instance will be completely independent of the original
         :param num_players: the number of players in the game.
         :type num_players: int
+        :param config: deck and dealing settings, DEFAULT_CONFIG if None. Copies share the configuration of other.
+        :type config: GameConfig
         """
         if other is None:
+            self.config = DEFAULT_CONFIG if config is None else config
             if num_players < 2:
                 raise ValueError('Must have at least 2 players.')    
+            if num_players > self.config.max_players:
+                raise ValueError(f'A deck of {self.config.num_cards} cards can deal hands of {self.config.hand_size} to at most {self.config.max_players} players.')
             
             # player setup
             self.player_numbers = [i for i in range(num_players)] # tracks the indices of the remaining players
+            self.indexSeats()
             self.players = [HumanPlayer(game = self, position = i) for i in range(0, num_humans)] + [Player(game = self, position = i) for i in range(num_humans, num_players)]
             self.initPlayerHandBeliefs() 
 
@@ -119,14 +275,16 @@ class TransferDurak:
             self.attacker_pos = 0 # index in self.players of the attacker
             self.defender_pos = 1 # index in self.players of the defender
             self.round = 0 # a round is one full cycle of attack and defense
-            self.trump = random.randint(0, SUITS - 1)
+            self.trump = random.randint(0, self.config.suits - 1)
             
             self.deal()
 
 
         else: # copy construcor. Carefully copy data without referencing old game
-            
-            self.player_numbers = copy.deepcopy(other.player_numbers)
+            # cards are immutable and shared with the config's card table, so only the containers holding them are copied
+            self.config = other.config # immutable, shared
+            self.player_numbers = list(other.player_numbers)
+            self.seat_index = list(other.seat_index)
 
             self.players = []
             for i,p in enumerate(other.players):
@@ -134,19 +292,19 @@ class TransferDurak:
                     self.players.append(HumanPlayer(self, p.position))
                 else:
                     self.players.append(Player(self, p.position))
-                self.players[i].hand = copy.deepcopy(p.hand)
-                self.players[i].hand_beliefs = copy.deepcopy(p.hand_beliefs)
-                self.players[i].talon_belief = copy.deepcopy(p.talon_belief)
+                self.players[i].hand = list(p.hand)
+                self.players[i].hand_beliefs = [set(belief) for belief in p.hand_beliefs]
+                self.players[i].talon_belief = set(p.talon_belief)
             
-            self.last_move_str = copy.deepcopy(other.last_move)
-            self.last_move = copy.deepcopy(other.last_move)
+            self.last_move_str = other.last_move_str
+            self.last_move = other.last_move # actions are tuples of cards
             self.last_player = other.last_player
-            self.attack_cards = copy.deepcopy(other.attack_cards)
-            self.defense_cards = copy.deepcopy(other.defense_cards)
-            self.talon = copy.deepcopy(other.talon)
-            self.discard = copy.deepcopy(other.discard)
-            self.last_attack = copy.deepcopy(other.last_attack)
-            self.last_defense = copy.deepcopy(other.last_defense)
+            self.attack_cards = list(other.attack_cards)
+            self.defense_cards = list(other.defense_cards)
+            self.talon = list(other.talon)
+            self.discard = set(other.discard)
+            self.last_attack = copy.copy(other.last_attack) # a list or a set depending on how the round ended
+            self.last_defense = copy.copy(other.last_defense)
             self.is_attacker_move = other.is_attacker_move
             self.defender_eating = other.defender_eating
             self.attacker_pos = other.attacker_pos
@@ -245,7 +403,7 @@ class TransferDurak:
         message += ' ' * (available_chars + 1) + '|\n'
 
         # talon box line 2
-        if SUITS == 4:
+        if self.config.suits == 4:
             message += (f'| Trump: {COLORMAP[self.trump]}{SUITMAP[self.trump]}{RESET_COLOR}' + ' ' * (len(talon_border) - 10) + '|')
 
         # order box line 2
@@ -410,35 +568,46 @@ class TransferDurak:
         return False # d is not a trump and is not the same suit as c, or d's rank is lower than c's
 
 
-    def allowedAttackerPositions(self) -> list[int]:
+    def allowedAttackerPositions(self) -> tuple[int, ...]:
         """
-        Docstring for allowedAttackerPositions
+        Looks up the allowed attackers of the current defender in the configuration's attacker_table.
         
         :param self: TransferDurak instance
-        :return: An ordered list of the indices of the allowed attackers. Indices refer to positions in the self.players list.
-        :rtype: list[int]
+        :return: An ordered tuple of the indices of the allowed attackers. Indices refer to positions in the self.players list.
+        :rtype: tuple[int, ...]
         """
-        if len(self.players) < 3:
-            return [self.movePosition(self.defender_pos, 1)] # only one possible attacker
-        if len(self.players) == 3:
-            return [self.movePosition(self.defender_pos, -1), self.movePosition(self.defender_pos, 1)]
-        elif len(self.players) == 4:
-            return [self.movePosition(self.defender_pos, -1), self.movePosition(self.defender_pos, 1), self.movePosition(self.defender_pos, 2)] # other 3 players attack right, left, across (from defender)
-        else: # >= 5 players
-            return [self.movePosition(self.defender_pos, 1), self.movePosition(self.defender_pos, -1)] # attackers to either side of the player
+        return self.config.attacker_table[len(self.players)][self.defender_pos]
+
+
+    def indexSeats(self):
+        """
+        Rebuilds self.seat_index from self.player_numbers. Call whenever self.player_numbers changes.
+        
+        :param self: TransferDurak instance
+        """
+        self.seat_index = [None] * (max(self.player_numbers) + 1) # player number -> index in self.players, None once the player is out
+        for i, number in enumerate(self.player_numbers):
+            self.seat_index[number] = i
+
+
+    def numSeats(self) -> int:
+        """
+        Length of vectors indexed by the numbers of the players still in the game (such as search.rewardVector).
+        
+        :param self: TransferDurak instance
+        :rtype: int
+        """
+        return len(self.seat_index)
 
 
     def generateTalon(self):
-        talon = []
-        for suit in range(SUITS):
-            for rank in range(RANKS):
-                talon.append(Card(rank, suit))
+        talon = list(self.config.cards)
         random.shuffle(talon) # randomly permute talon
         return talon
     
 
     def deal(self):
-        for i in range(6):
+        for i in range(self.config.hand_size):
             for player in self.players:
                 player.privatePickUp(self.drawFromTalon())
 
@@ -487,7 +656,7 @@ class TransferDurak:
         restock_order = [(first_attacker_pos - i) % len(self.players) for i in range(len(self.players))]
         for i in restock_order:
             p = self.players[i]
-            while len(p.hand) < HAND_SIZE and len(self.talon) > 0: # draw from talon until hands full or talon empty
+            while len(p.hand) < self.config.hand_size and len(self.talon) > 0: # draw from talon until hands full or talon empty
                 p.privatePickUp(self.drawFromTalon())
 
 
@@ -509,9 +678,7 @@ class TransferDurak:
         ONLY CALL WHEN PASSING IS ALLOWED. Otherwise, passAttack() will fail catastrophically.
         :param self: TransferDurak instance
         """
-        eligible = self.allowedAttackerPositions() # list of allowed attackers
-        cur_idx = eligible.index(self.attacker_pos) # index of current attacker in the list of allowed attackers
-        self.attacker_pos = eligible[cur_idx + 1] # next allowed attacker in the list
+        self.attacker_pos = self.config.next_attacker[len(self.players)][self.defender_pos][self.attacker_pos] # next allowed attacker in the list
 
 
     def transition(self, a: tuple):
@@ -593,6 +760,24 @@ class TransferDurak:
         self.removeOutPlayers()
 
 
+    def play(self, a: tuple):
+        """
+        Plays action a for the current player: records it as the last move, transitions the game, and restocks hands if the round ended.
+        This is one step of the game loop; transition alone does not restock.
+
+        :param self: TransferDurak instance
+        :param a: action taken
+        :type a: tuple
+        """
+        self.last_player = self.getCurrentPlayerNumber()
+        self.last_move = a
+        last_round = self.round
+        self.transition(a)
+        if self.round > last_round: # restock hands after end of round
+            self.restockHands()
+            self.removeOutPlayers() # a player the talon could not refill is out before anyone has to attack them
+
+
     def removeOutPlayers(self):
         """
         Removes players from the game who have no cards
@@ -604,6 +789,7 @@ class TransferDurak:
                 if len(p.hand) < 1:
                     self.player_numbers.pop(i) # remove the index of that player from the list of available indices
                     self.players.pop(i) # remove the player from the list of players
+                    self.indexSeats()
 
                     # move around attacker and defender indices based on who is removed from the game
                     if self.attacker_pos >= i:
@@ -750,14 +936,15 @@ class TransferDurak:
             return self.player_numbers[self.defender_pos]
 
 
-    def actions(self):
+    def actions(self, prune_equivalent : bool = False):
         """
         Returns the possible actions in the current state.
         
         :param self: TransferDurak instance.
+        :param prune_equivalent: collapse actions that only differ by equivalent cards (see Player.actions)
         """
         player = self.getCurrentPlayer()
-        return player.actions()
+        return player.actions(prune_equivalent)
     
         
     def sampleBelief(self):
@@ -787,13 +974,112 @@ class TransferDurak:
         # sample hands for players
         for i,other in enumerate(self.players):
             if other is not player: # only override other players hands
-                hand = player.hand_beliefs[i]
+                hand = set(player.hand_beliefs[i]) # copy, so sampling does not add cards to the player's beliefs
                 while len(hand) < len(other.hand): # only sample up to size of player's hand
                     hand.add(available_cards.pop(-1)) # add a random card from the available cards
                 newState.players[i].hand = list(hand) # override hand
         
         return newState
 
+
+    def toBytes(self) -> bytes:
+        """
+        Encodes the full game state (deck settings, hands, beliefs, talon order, discard, positions, phase flags, trump) in a compact binary format.
+        A game takes between 60 and 200 bytes, depending on the number of players. Display-only state (last_move_str) is not encoded.
+
+        :param self: TransferDurak instance
+        :return: the encoded state, decoded by TransferDurak.fromBytes
+        :rtype: bytes
+        """
+        out = bytearray(STATE_MAGIC)
+        flags = (1 if self.is_attacker_move else 0) | (2 if self.defender_eating else 0)
+        config = self.config
+        out += bytes((STATE_FORMAT_VERSION, config.suits, config.ranks, config.hand_size, len(self.players), flags, self.attacker_pos, self.defender_pos, self.trump))
+        out += struct.pack('<Hb', self.round, -1 if self.last_player is None else self.last_player)
+        out += bytes(self.player_numbers)
+        for p in self.players:
+            out.append(1 if type(p) is HumanPlayer else 0)
+            writeCards(out, p.hand, config)
+            for belief in p.hand_beliefs:
+                out += cardMask(belief, config)
+            out += cardMask(p.talon_belief, config)
+        writeCards(out, self.talon, config)
+        out += cardMask(self.discard, config)
+        for cards in (self.attack_cards, self.defense_cards, self.last_attack, self.last_defense):
+            writeCards(out, cards, config)
+        if self.last_move is None:
+            out.append(0)
+        else:
+            out.append(ord(self.last_move[0]))
+            writeCards(out, self.last_move[1], config)
+        return bytes(out)
+
+
+    @classmethod
+    def fromBytes(cls, data, offset : int = 0):
+        """
+        Decodes a state encoded by toBytes. Card objects are shared between decoded states (cards are never modified),
+        and the game gets the shared GameConfig of the encoded deck settings.
+
+        :param data: bytes-like object (bytes, bytearray, memoryview of a shared memory buffer, ...)
+        :param offset: position of the encoded state in data
+        :return: the decoded game
+        :rtype: TransferDurak
+        """
+        data = memoryview(data)
+        if bytes(data[offset:offset + 2]) != STATE_MAGIC:
+            raise ValueError('not an encoded TransferDurak state')
+        version = data[offset + 2]
+        if version != STATE_FORMAT_VERSION:
+            raise ValueError(f'state format version {version} is not supported (expected {STATE_FORMAT_VERSION})')
+        suits, ranks, hand_size, num_players, flags, attacker_pos, defender_pos, trump = data[offset + 3:offset + 11]
+        game = cls.__new__(cls)
+        game.config = config = GameConfig.get(suits, ranks, hand_size)
+        game.round, last_player = struct.unpack_from('<Hb', data, offset + 11)
+        i = offset + 14
+        game.player_numbers = list(data[i:i + num_players])
+        game.indexSeats()
+        i += num_players
+
+        game.players = []
+        for number in game.player_numbers:
+            p = (HumanPlayer if data[i] else Player).__new__(HumanPlayer if data[i] else Player)
+            p.game = game
+            p.position = number
+            p.hand, i = readCards(data, i + 1, config)
+            p.hand_beliefs = []
+            for j in range(num_players):
+                belief, i = readCardMask(data, i, config)
+                p.hand_beliefs.append(belief)
+            p.talon_belief, i = readCardMask(data, i, config)
+            game.players.append(p)
+
+        game.talon, i = readCards(data, i, config)
+        game.discard, i = readCardMask(data, i, config)
+        game.attack_cards, i = readCards(data, i, config)
+        game.defense_cards, i = readCards(data, i, config)
+        game.last_attack, i = readCards(data, i, config)
+        game.last_defense, i = readCards(data, i, config)
+        if data[i] == 0:
+            game.last_move = None
+        else:
+            cards, _ = readCards(data, i + 1, config)
+            game.last_move = (chr(data[i]), tuple(cards))
+
+        game.last_move_str = ''
+        game.last_player = None if last_player < 0 else last_player
+        game.is_attacker_move = bool(flags & 1)
+        game.defender_eating = bool(flags & 2)
+        game.attacker_pos = attacker_pos
+        game.defender_pos = defender_pos
+        game.trump = trump
+        return game
+
+
+    def __reduce__(self):
+        # pickle (and so multiprocessing) sends the compact encoding instead of the object graph
+        return (TransferDurak.fromBytes, (self.toBytes(),))
+
 ###################################################################
 #                         Player Class                            #
 ###################################################################
@@ -853,7 +1139,7 @@ class Player:
             else:
                 cards = (cards,)
 
-        cur_player_idx = self.game.player_numbers.index(self.position) # the index in the hand beliefs that must be updated
+        cur_player_idx = self.game.seat_index[self.position] # the index in the hand beliefs that must be updated
 
         for c in cards:
             # propogates information to other players about what cards you have (because they watched you pick them up during an attack)
@@ -878,7 +1164,7 @@ class Player:
             else:
                 cards = (cards,)
          
-        cur_player_idx = self.game.player_numbers.index(self.position) # the index in the hand beliefs that must be updated
+        cur_player_idx = self.game.seat_index[self.position] # the index in the hand beliefs that must be updated
 
         for c in cards:
             # propagates information to other players about what cards you have (because they watched you play it during an attack or defense)
@@ -900,7 +1186,7 @@ class Player:
         attacks = []
         for r in ranks:
             cards_of_rank = [card for card in self.hand if card.rank == r]
-            attacks += getAllSubsets(cards_of_rank)
+            attacks += self.game.config.subsets(cards_of_rank)
         defender = self.game.getDefender()
         return [('a', tuple(a)) for a in attacks if len(a) > 0 and len(a) <= defender.handSize()] # return nonempty attacks <= the defender's hand size
 
@@ -934,12 +1220,8 @@ class Player:
         
         :param self: Player instance
         """
-        eligible = self.game.allowedAttackerPositions() # indices of game.players list that are allowed to attack
-        player_list_idx = self.game.player_numbers.index(self.position) # index of self in game.players list
-        cur_idx = eligible.index(player_list_idx) # index of player_list_idx in the allowed attacker list
-        if cur_idx < len(eligible) - 1:
-            return True
-        return False
+        player_list_idx = self.game.seat_index[self.position] # index of self in game.players list
+        return player_list_idx in self.game.config.next_attacker[len(self.game.players)][self.game.defender_pos] # an allowed attacker that is not the last one
 
 
     def attackerActions(self) -> list[tuple]:
@@ -989,20 +1271,71 @@ class Player:
                 receiving_player = self.game.players[self.game.movePosition(self.game.defender_pos, 1)] # get player who would receive transfer
                 # all the ways the defender can pass the cards
                 # worst rule in the game NOT allowed (check to make sure it is less than the new defender's hand size)
-                possible_actions += [('t', tuple(cards)) for cards in getAllSubsets(matching_rank_cards) if len(cards) > 0 and (len(cards) + len(self.game.attack_cards)) <= receiving_player.handSize()]
+                possible_actions += [('t', tuple(cards)) for cards in self.game.config.subsets(matching_rank_cards) if len(cards) > 0 and (len(cards) + len(self.game.attack_cards)) <= receiving_player.handSize()]
             possible_actions += [('d', cards) for cards in self.possibleDefenses()] # actions if we choose to defend
         return possible_actions
 
     
-    def actions(self) -> list[tuple]:
+    def equivalentCards(self) -> dict:
+        """
+        Groups the cards in hand that beat, and are beaten by, exactly the same cards still in play:
+        cards of one suit such that every card of that suit ranked between them is in this hand or in the discard pile.
+        Equivalent cards still differ in rank, which decides what may be added to an attack or transferred,
+        so collapsing them is an approximation that search trades for a smaller branching factor.
+        
+        :param self: Player instance
+        :return: dictionary mapping every card in hand to the lowest card of its group
+        :rtype: dict
+        """
+        in_hand = set(self.hand)
+        representative = {}
+        config = self.game.config
+        for suit in range(config.suits):
+            lowest = None # lowest card of the group being built, None if the last card seen may still be played by someone else
+            for rank in range(config.ranks):
+                card = config.card(rank, suit)
+                if card in in_hand:
+                    if lowest is None:
+                        lowest = card
+                    representative[card] = lowest
+                elif card not in self.game.discard:
+                    lowest = None
+        return representative
+
+
+    def pruneEquivalentActions(self, actions : list[tuple]) -> list[tuple]:
+        """
+        Keeps one action for every group of actions that only differ by equivalent cards (see equivalentCards),
+        the one playing the lowest ranks, in the position of the group's first action.
+        
+        :param self: Player instance
+        :param actions: actions of self
+        :return: the pruned actions
+        :rtype: list[tuple]
+        """
+        representative = self.equivalentCards()
+        kept = {}
+        for a_type, cards in actions:
+            key = (a_type, tuple(representative[card] for card in cards))
+            if key not in kept or [card.rank for card in cards] < [card.rank for card in kept[key][1]]:
+                kept[key] = (a_type, cards)
+        return list(kept.values())
+
+
+    def actions(self, prune_equivalent : bool = False) -> list[tuple]:
         """
         Returns a list of all possible actions for the current player. Returns the empty list if self is not the current player of self.game.
         
         :param self: Player instance
+        :param prune_equivalent: collapse actions that only differ by equivalent cards into one (see pruneEquivalentActions)
+        :type prune_equivalent: bool
         :return: a list of possible actions
         :rtype: list[tuple]
         """
-        return self.attackerActions() + self.defenderActions()
+        actions = self.attackerActions() + self.defenderActions()
+        if prune_equivalent:
+            actions = self.pruneEquivalentActions(actions)
+        return actions
 
 
     def handSize(self):
@@ -1026,10 +1359,12 @@ class Player:
                 continue
 
             # prefer passing to blocking, riding, and eating
-            if a_type == 'p' and best_action[0] in ['b', 'r', 'e']:
-                best_action = (a_type, cards)
-                best_rank = float('inf')
-                best_has_trump = True
+            if a_type == 'p':
+                if best_action[0] in ['b', 'r', 'e']:
+                    best_action = (a_type, cards)
+                    best_rank = float('inf')
+                    best_has_trump = True
+                continue
 
             # FROM HERE BELOW IN THE FOR LOOP, a_type == 'a'
 
@@ -1066,6 +1401,40 @@ class Player:
 
         return best_action, best_rank, best_has_trump
 
+
+    def actionValue(self, action : tuple) -> tuple:
+        """
+        Sort key ordering actions the way lowestValueAction prefers them: card plays without trumps by their highest rank,
+        then card plays with trumps by their highest trump, then passing, then blocking, riding, and eating.
+        
+        :param self: Player instance
+        :param action: action to rank
+        :type action: tuple
+        :return: key where lower values are preferred
+        :rtype: tuple
+        """
+        a_type, cards = action
+        if a_type in ['b', 'r', 'e']:
+            return (2, True, 0)
+        if a_type == 'p':
+            return (1, True, 0)
+        trump_ranks = [card.rank for card in cards if self.game.isTrump(card)]
+        if len(trump_ranks) > 0:
+            return (0, True, max(trump_ranks))
+        return (0, False, max([card.rank for card in cards]))
+
+
+    def rankActions(self, actions : list[tuple]) -> list[tuple]:
+        """
+        Returns actions sorted from most to least preferred by lowestValueAction.
+        
+        :param self: Player instance
+        :param actions: a list of actions generated by player.actions()
+        :type actions: list[tuple]
+        :rtype: list[tuple]
+        """
+        return sorted(actions, key = self.actionValue)
+
     def chooseActionHeuristic(self):
         # IDEAS:
         # track the number of different ranks in the attack
@@ -1080,9 +1449,6 @@ class Player:
         
         :param self: Description
         """
-        TALON_TOLERANCE = 4
-        EPSILON = 0.1
-
         actions = self.actions()
         a, max_rank, has_trump = self.lowestValueAction(actions)
         # prefer passing to blocking, riding, eating
@@ -1121,7 +1487,7 @@ class HumanPlayer(Player):
         
         :param self: HumanPlayer instance
         """
-        actions = self.actions()
+        actions = self.attackerActions() + self.defenderActions() # a human may play any card, even when search prunes equivalent ones
         key = None
         if self.position == self.game.player_numbers[self.game.attacker_pos]: # if the player is attacking
             while key not in [str(i) for i in range(1, len(actions) + 1)]:
@@ -1188,6 +1554,191 @@ class HumanPlayer(Player):
                     print(c, end = ' ')
                 print('')
 
+###################################################################
+#                          Serialization                          #
+###################################################################
+
+def writeCards(out : bytearray, cards, config : GameConfig):
+    """
+    Appends an ordered collection of cards to out: its length, then the id of every card in config.
+    """
+    out.append(len(cards))
+    out += bytes(config.cardId(card) for card in cards)
+
+
+def readCards(data : memoryview, i : int, config : GameConfig) -> tuple[list, int]:
+    """
+    Reads cards written by writeCards at position i.
+
+    :return: the cards and the position after them
+    :rtype: tuple[list[Card], int]
+    """
+    n = data[i]
+    return [config.cards[index] for index in data[i + 1:i + 1 + n]], i + 1 + n
+
+
+def cardMask(cards, config : GameConfig) -> bytes:
+    """
+    Encodes a set of cards as a bit mask of config.mask_bytes bytes.
+    """
+    return config.bits(cards).to_bytes(config.mask_bytes, 'little')
+
+
+def readCardMask(data : memoryview, i : int, config : GameConfig) -> tuple[set, int]:
+    """
+    Reads a bit mask written by cardMask at position i.
+
+    :return: the set of cards and the position after the mask
+    :rtype: tuple[set[Card], int]
+    """
+    mask = int.from_bytes(data[i:i + config.mask_bytes], 'little')
+    cards = set()
+    index = 0
+    while mask:
+        if mask & 1:
+            cards.add(config.cards[index])
+        mask >>= 1
+        index += 1
+    return cards, i + config.mask_bytes
+
+
+def writeState(game : TransferDurak, buffer, offset : int = 0) -> int:
+    """
+    Writes game into a writable buffer (e.g. multiprocessing.shared_memory.SharedMemory.buf), prefixed by its length.
+
+    :param game: game to write
+    :param buffer: writable bytes-like object
+    :param offset: position to write at
+    :return: number of bytes written
+    :rtype: int
+    """
+    data = game.toBytes()
+    struct.pack_into('<H', buffer, offset, len(data))
+    buffer[offset + 2:offset + 2 + len(data)] = data
+    return 2 + len(data)
+
+
+def readState(buffer, offset : int = 0) -> tuple[TransferDurak, int]:
+    """
+    Reads a game written by writeState.
+
+    :param buffer: bytes-like object
+    :param offset: position the game was written at
+    :return: the game and the number of bytes read
+    :rtype: tuple[TransferDurak, int]
+    """
+    (size,) = struct.unpack_from('<H', buffer, offset)
+    return TransferDurak.fromBytes(buffer, offset + 2), 2 + size
+
+###################################################################
+#                          Game Driver                            #
+###################################################################
+
+# An agent is a function taking the game and returning the action of its current player.
+# Drivers take either one agent for every player, or a list (or dict) of agents indexed by player number.
+
+class GameStep:
+    __slots__ = ('player', 'action', 'seconds', 'state')
+
+    def __init__(self, player : int, action : tuple, seconds : float, state):
+        """
+        One action of a game played by playGame.
+
+        :param player: number of the player who took the action
+        :param action: the action
+        :param seconds: time the agent took to choose the action (0.0 unless timing was requested)
+        :param state: the game after the action. This is the live game, not a copy: copy it before the driver continues if it must be kept.
+        """
+        self.player = player
+        self.action = action
+        self.seconds = seconds
+        self.state = state
+
+
+def agentFor(agents, player : int):
+    return agents if callable(agents) else agents[player]
+
+
+def playGame(game : TransferDurak, agents, max_plies : int = None, timed : bool = False):
+    """
+    Plays game until it ends (or for max_plies actions), yielding a GameStep after every action.
+    Nothing is played until the generator is consumed. Use runGame when the steps are not needed.
+
+    :param game: game to play. It is modified in place.
+    :type game: TransferDurak
+    :param agents: one agent for every player, or agents indexed by player number
+    :param max_plies: maximum number of actions, or None to play to the end
+    :param timed: measure the time each agent takes to choose
+    :return: generator of GameStep
+    """
+    plies = 0
+    while not game.isTerminal() and (max_plies is None or plies < max_plies):
+        player = game.getCurrentPlayerNumber()
+        agent = agentFor(agents, player)
+        if timed:
+            start = time.perf_counter()
+            a = agent(game)
+            seconds = time.perf_counter() - start
+        else:
+            a = agent(game)
+            seconds = 0.0
+        game.play(a)
+        plies += 1
+        yield GameStep(player, a, seconds, game)
+
+
+def runGame(game : TransferDurak, agents, max_plies : int = None, trace : list = None) -> int:
+    """
+    Plays game until it ends (or for max_plies actions) without producing steps. The durak is game.player_numbers[0] once game.isTerminal().
+
+    :param game: game to play. It is modified in place.
+    :type game: TransferDurak
+    :param agents: one agent for every player, or agents indexed by player number
+    :param max_plies: maximum number of actions, or None to play to the end
+    :param trace: list to append the (player, action) pairs of the game to, or None to not record them
+    :return: number of actions played
+    :rtype: int
+    """
+    plies = 0
+    single = callable(agents)
+    while not game.isTerminal() and (max_plies is None or plies < max_plies):
+        player = game.getCurrentPlayerNumber()
+        a = agents(game) if single else agents[player](game)
+        if trace is not None:
+            trace.append((player, a))
+        game.play(a)
+        plies += 1
+    return plies
+
+
+def playGames(games : list[TransferDurak], batch_agent, max_plies : int = None, timed : bool = False):
+    """
+    Plays many games at once. Every pass hands the positions of all unfinished games to batch_agent in a single call,
+    plays the returned actions and yields (game index, GameStep) for each of them.
+    This lets the agent batch its work across games, e.g. score the positions of all games with one evaluator call.
+    An ordinary agent can be used as lambda states: [agent(state) for state in states].
+
+    :param games: games to play. They are modified in place.
+    :type games: list[TransferDurak]
+    :param batch_agent: function taking a list of games and returning the action of the current player of each of them
+    :param max_plies: maximum number of actions per game, or None to play every game to the end
+    :param timed: measure the time batch_agent takes per pass. Each step gets an equal share of it
+    :return: generator of (int, GameStep)
+    """
+    plies = [0] * len(games)
+    while True:
+        pending = [i for i, game in enumerate(games) if not game.isTerminal() and (max_plies is None or plies[i] < max_plies)]
+        if len(pending) == 0:
+            return
+        players = [games[i].getCurrentPlayerNumber() for i in pending]
+        start = time.perf_counter() if timed else 0.0
+        actions = batch_agent([games[i] for i in pending])
+        seconds = (time.perf_counter() - start) / len(pending) if timed else 0.0
+        for i, player, a in zip(pending, players, actions):
+            games[i].play(a)
+            plies[i] += 1
+            yield i, GameStep(player, a, seconds, games[i])
+
 ###################################################################
 #                       Helper Functions                          #
 ###################################################################
@@ -1231,3 +1782,7 @@ def clearScreen():
         _ = os.system('cls')
     else:
         _ = os.system('clear')
+
+
+# configuration of games built without one (SUITS, RANKS and HAND_SIZE). Built last, since its tables use the helper functions
+DEFAULT_CONFIG : GameConfig = GameConfig.get()
@@ -0,0 +1,269 @@
+from durak import TransferDurak
+import argparse
+import random
+import time
+import sys
+
+###################################################################
+#                       Global Constants                          #
+###################################################################
+
+FUZZ_GAMES : int = 1000 # number of random games per run
+FUZZ_SEED : int = 0 # game i of a run uses seed FUZZ_SEED + i
+MAX_STEPS : int = 1000 # games still running after this many plies are cut off (a bug may make a game never end)
+
+###################################################################
+#                        State Signatures                         #
+###################################################################
+
+def cardKey(card) -> tuple[int, int]:
+    return (card.rank, card.suit)
+
+
+def actionKey(a : tuple) -> tuple:
+    return (a[0], tuple(cardKey(card) for card in a[1]))
+
+
+def stateSignature(state : TransferDurak) -> dict:
+    """
+    Summarizes every piece of state that the rules depend on as plain, comparable values.
+    Another engine can be fuzzed against TransferDurak by giving it a function returning the same signature.
+
+    :param state: game to summarize
+    :type state: TransferDurak
+    :return: field name -> value. Players are keyed by player number, not by index in state.players.
+    :rtype: dict
+    """
+    terminal = state.isTerminal()
+    numbers = state.player_numbers
+    signature = {
+        'terminal': terminal,
+        'config': (state.config.suits, state.config.ranks, state.config.hand_size),
+        'player_numbers': list(numbers),
+        'seat_index': {n: state.seat_index[n] for n in numbers}, # must agree with player_numbers after players leave
+        'trump': state.trump,
+        'round': state.round,
+        'talon': [cardKey(card) for card in state.talon], # order matters, it is the order cards are drawn in
+        'discard': sorted(cardKey(card) for card in state.discard),
+        'attack_cards': [cardKey(card) for card in state.attack_cards],
+        'defense_cards': [cardKey(card) for card in state.defense_cards],
+        'last_attack': sorted(cardKey(card) for card in state.last_attack),
+        'last_defense': sorted(cardKey(card) for card in state.last_defense),
+        'is_attacker_move': state.is_attacker_move,
+        'defender_eating': state.defender_eating,
+        'attacker': numbers[state.attacker_pos],
+        'defender': numbers[state.defender_pos],
+        'hands': {numbers[i]: sorted(cardKey(card) for card in p.hand) for i, p in enumerate(state.players)},
+        'hand_beliefs': {numbers[i]: {numbers[j]: sorted(cardKey(card) for card in belief) for j, belief in enumerate(p.hand_beliefs)}
+                         for i, p in enumerate(state.players)},
+        'talon_beliefs': {numbers[i]: sorted(cardKey(card) for card in p.talon_belief) for i, p in enumerate(state.players)},
+    }
+    if terminal:
+        signature['durak'] = numbers[0] if len(numbers) == 1 else None
+    else:
+        signature['current_player'] = state.getCurrentPlayerNumber()
+        signature['actions'] = sorted(actionKey(a) for a in state.actions())
+    return signature
+
+###################################################################
+#                     Differential Game Runner                    #
+###################################################################
+
+class Mismatch:
+    def __init__(self, seed : int, num_players : int, choices : list[int], step : int, field : str, expected, actual):
+        """
+        A divergence between the reference and the candidate engine.
+
+        :param seed: seed the game was dealt with
+        :param num_players: number of players in the game
+        :param choices: action choices replayed to reach the divergence (see runTrace)
+        :param step: number of actions played when the signatures diverged
+        :param field: first signature field that differs
+        :param expected: value of field in the reference engine
+        :param actual: value of field in the candidate engine
+        """
+        self.seed = seed
+        self.num_players = num_players
+        self.choices = choices
+        self.step = step
+        self.field = field
+        self.expected = expected
+        self.actual = actual
+
+
+    def __str__(self) -> str:
+        return (f'seed {self.seed}, {self.num_players} players, choices {self.choices}: after {self.step} actions {self.field} differs\n'
+                f'  reference: {self.expected}\n  candidate: {self.actual}')
+
+
+def copyEngine(state : TransferDurak) -> TransferDurak:
+    """
+    Default candidate engine: a copy of the reference game made with the copy constructor.
+    Catches copies that share state with their original, which silently corrupts search trees.
+    """
+    return TransferDurak(state)
+
+
+def bytesEngine(state : TransferDurak) -> TransferDurak:
+    """
+    Candidate engine decoded from the binary encoding of the reference game (TransferDurak.toBytes).
+    """
+    return TransferDurak.fromBytes(state.toBytes())
+
+
+CANDIDATES : dict = {'copy': copyEngine, 'bytes': bytesEngine} # candidates selectable with --candidate
+
+
+def compareSignatures(expected : dict, actual : dict):
+    """
+    :return: the first field where the signatures differ, or None if they are equal
+    """
+    for field in expected.keys() | actual.keys():
+        if expected.get(field) != actual.get(field):
+            return field
+    return None
+
+
+def guardedSignature(signature, state):
+    try:
+        return signature(state)
+    except Exception as e:
+        return {'exception': repr(e)}
+
+
+def runTrace(seed : int, num_players : int, choices : list[int] = None, candidate = copyEngine, signature = stateSignature,
+             candidate_signature = None, rng : random.Random = None) -> tuple[Mismatch, list[int]]:
+    """
+    Deals a game with seed and plays it through the reference engine and the candidate engine side by side, comparing signatures after every action.
+    The action at step k is choices[k] modulo the number of legal actions, indexing the actions in actionKey order, so any list of integers is a valid trace.
+
+    :param seed: seed to deal the game with
+    :param num_players: number of players
+    :param choices: action choices to replay, or None to choose with rng until the game ends
+    :param candidate: function converting a freshly dealt TransferDurak into the engine under test (which must provide actions() and play(a))
+    :param signature: signature function for the reference engine
+    :param candidate_signature: signature function for the candidate engine, or None to use signature
+    :param rng: random source for choices when choices is None
+    :return: the first mismatch (or None), and the choices that were played
+    :rtype: tuple[Mismatch, list[int]]
+    """
+    if candidate_signature is None:
+        candidate_signature = signature
+    random.seed(seed)
+    reference = TransferDurak(num_players = num_players, num_humans = 0)
+    other = candidate(TransferDurak(reference))
+    played = []
+
+    step = 0
+    while True:
+        expected = guardedSignature(signature, reference)
+        actual = guardedSignature(candidate_signature, other)
+        field = compareSignatures(expected, actual)
+        if field is not None:
+            return Mismatch(seed, num_players, played, step, field, expected.get(field), actual.get(field)), played
+        if 'exception' in expected or expected['terminal'] or step >= MAX_STEPS:
+            return None, played
+        if choices is not None:
+            if step >= len(choices):
+                return None, played
+            choice = choices[step]
+        else:
+            choice = rng.randrange(len(expected['actions']))
+        actions = sorted(reference.actions(), key = actionKey)
+        a = actions[choice % len(actions)]
+        played.append(choice % len(actions))
+
+        for state in (reference, other):
+            try:
+                state.play(a)
+            except Exception as e:
+                if state is reference:
+                    return None, played # the reference engine cannot continue, so there is nothing left to compare
+                return Mismatch(seed, num_players, played, step + 1, 'exception', None, repr(e)), played
+        step += 1
+
+
+def shrink(mismatch : Mismatch, **engines) -> Mismatch:
+    """
+    Shrinks the action trace of a mismatch: drops chunks of choices and lowers individual choices for as long as the engines still diverge.
+
+    :param mismatch: mismatch found by runTrace
+    :param engines: the candidate and signature arguments that were passed to runTrace
+    :return: a mismatch with a trace that cannot be shrunk further this way
+    :rtype: Mismatch
+    """
+    def attempt(choices):
+        found, _ = runTrace(mismatch.seed, mismatch.num_players, choices, **engines)
+        return found
+
+    best = mismatch
+    best.choices = best.choices[:best.step]
+    improved = True
+    while improved:
+        improved = False
+        chunk = len(best.choices) // 2
+        while chunk >= 1:
+            start = 0
+            while start < len(best.choices):
+                found = attempt(best.choices[:start] + best.choices[start + chunk:])
+                if found is not None:
+                    found.choices = found.choices[:found.step]
+                    best = found
+                    improved = True
+                else:
+                    start += chunk
+            chunk //= 2
+        for k in range(len(best.choices)):
+            for lower in range(best.choices[k]):
+                found = attempt(best.choices[:k] + [lower] + best.choices[k + 1:])
+                if found is not None:
+                    found.choices = found.choices[:found.step]
+                    best = found
+                    improved = True
+                    break
+            if improved:
+                break
+    return best
+
+
+def fuzz(num_games : int = FUZZ_GAMES, seed : int = FUZZ_SEED, player_counts : list[int] = [2, 3, 4], verbose : bool = True, **engines) -> list[Mismatch]:
+    """
+    Plays num_games random games through the reference and candidate engines, shrinking every divergence found.
+
+    :param num_games: number of games
+    :param seed: game i is dealt with seed + i, and its actions are chosen by random.Random(seed + i)
+    :param player_counts: game i has player_counts[i % len(player_counts)] players
+    :param verbose: print progress and mismatches
+    :param engines: candidate, signature and candidate_signature arguments for runTrace
+    :return: the shrunk mismatches
+    :rtype: list[Mismatch]
+    """
+    mismatches = []
+    start = time.perf_counter()
+    plies = 0
+    for i in range(num_games):
+        num_players = player_counts[i % len(player_counts)]
+        found, played = runTrace(seed + i, num_players, rng = random.Random(seed + i), **engines)
+        plies += len(played)
+        if found is not None:
+            found = shrink(found, **engines)
+            mismatches.append(found)
+            if verbose:
+                print(found)
+        if verbose and (i + 1) % 100 == 0:
+            elapsed = time.perf_counter() - start
+            print(f'{i + 1} games, {plies} plies, {len(mismatches)} mismatches ({(i + 1) / elapsed:.1f} games/sec)')
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Plays random games through two engines and reports where they diverge.')
+    parser.add_argument('--games', type = int, default = FUZZ_GAMES, help = 'number of random games')
+    parser.add_argument('--seed', type = int, default = FUZZ_SEED, help = 'seed of the first game')
+    parser.add_argument('--players', type = int, nargs = '+', default = [2, 3, 4], help = 'player counts to cycle through')
+    parser.add_argument('--candidate', choices = list(CANDIDATES), default = 'copy', help = 'engine to compare against TransferDurak')
+    args = parser.parse_args()
+
+    mismatches = fuzz(args.games, args.seed, args.players, candidate = CANDIDATES[args.candidate])
+    print(f'{len(mismatches)} mismatches in {args.games} games')
+    sys.exit(1 if len(mismatches) > 0 else 0)
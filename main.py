@@ -1,7 +1,11 @@
 from durak import TransferDurak
 from durak import HumanPlayer
 from search import MCTS
+from search import releaseTree
+from search import hybridAction
+from search import ENDGAME_TALON
 from durak import clearScreen
+from ponder import Ponderer
 
 ###################################################################
 #                       Global Constants                          #
@@ -10,11 +14,22 @@ from durak import clearScreen
 NUMBER_OF_PLAYERS : int = 2 # number of players in the game
 NUMBER_OF_HUMANS : int = 1 # number of human players to control in the game
 NUM_MCTS_PLAYOUTS : int = 250 # number of games MCTS simulates to make a move
+PONDER : bool = True # whether the AI keeps searching in the background while a human chooses a move
 
 ###################################################################
 #                       Playing Function                          #
 ###################################################################
 
+def usesMCTS(game : TransferDurak) -> bool:
+    """
+    Returns True if the AI to move in game would run MCTS (more than one action and in the endgame).
+    
+    :param game: game where an AI player is to move
+    :type game: TransferDurak
+    """
+    return len(game.actions()) > 1 and len(game.talon) <= ENDGAME_TALON
+
+
 def humanPlay(game : TransferDurak):
     """
     Call on game to play the game as a human player, providing input for each of the human players in the game.
@@ -23,6 +38,7 @@ def humanPlay(game : TransferDurak):
     :type game: TransferDurak
     """
     human_player = game.players[0]
+    pondered_root = None # search tree grown while the human was choosing their last move
     while not game.isTerminal():
         # get player info
         player = game.getCurrentPlayer()
@@ -34,31 +50,25 @@ def humanPlay(game : TransferDurak):
 
         # choose player action
         if type(player) is HumanPlayer:
+            # search the AI's replies in the background while the human decides
+            if PONDER:
+                ponderer = Ponderer(game, should_ponder = lambda state: type(state.getCurrentPlayer()) is not HumanPlayer and usesMCTS(state))
+                ponderer.start()
             a = player.chooseAction()
+            if PONDER:
+                pondered_root = ponderer.finish(a) # tree of the position the human actually moved to
         else:
             key = input(f'\nPress enter to begin P{player_idx} AI move...')
-            # if there is only one action, do not run MCTS
-            actions = player.actions() 
-            if len(actions) == 1:
-                a = actions[0]
-            # if we are NOT in the endgame, do not run MCTS
-            elif len(game.talon) > 4:
-                a = player.chooseActionHeuristic()
-            else:
-                a = MCTS(game, num_iterations = NUM_MCTS_PLAYOUTS)
+            a = hybridAction(game, lambda state: MCTS(state, num_iterations = NUM_MCTS_PLAYOUTS, root = pondered_root))
+            if pondered_root is not None: # the pondered tree is only used for this move
+                releaseTree(pondered_root)
+            pondered_root = None
 
         # update display info
         game.last_move_str = game.getMoveString(a, player_idx)
-        game.last_player = game.getCurrentPlayerNumber()
-        game.last_move = a
-
-        # transition game to next state
-        last_round = game.round
-        game.transition(a)
 
-        # restock hands after end of round
-        if game.round > last_round:
-            game.restockHands()
+        # play action (restocks hands at the end of a round)
+        game.play(a)
 
     clearScreen()
     game.show(human_player, hide_other_hands = True)
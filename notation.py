@@ -0,0 +1,238 @@
+from durak import TransferDurak
+from durak import Player
+from durak import HumanPlayer
+from durak import Card
+from durak import GameConfig
+from durak import DEFAULT_CONFIG
+import argparse
+
+###################################################################
+#                       Global Constants                          #
+###################################################################
+
+NOTATION_VERSION : int = 1 # written as the v= field, increase whenever the notation changes
+
+# one character per rank and suit. Ranks follow the way Card prints them when possible.
+def rankChars(config : GameConfig) -> str:
+    return {9: '6789TJQKA', 13: '23456789TJQKA'}.get(config.ranks, '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'[:config.ranks])
+
+
+def suitChars(config : GameConfig) -> str:
+    return 'schd' if config.suits == 4 else 'abcdefghijklmnopqrstuvwxyz'[:config.suits] # spade, club, heart, diamond (durak.SUITMAP order)
+
+
+
+CORPUS_FILE : str = 'endgames.txt' # endgame corpus used by benchmark.py, one position per line
+
+###################################################################
+#                          Serializer                             #
+###################################################################
+
+# A position is a line of space separated key=value fields, for example (2 players, defender to move):
+#
+#   v=1 trump=h players=0,1 attacker=0 defender=1 turn=d round=9 talon=Qh9s hand0=6c7dAs hand1=8h9hTs attack=6s defense=- ...
+#
+# Cards are a rank character followed by a suit character (Qh is the queen of hearts), and card lists are written
+# without separators ('-' for an empty list). Ordered lists (talon, hands, table) keep their order: the last talon card is
+# drawn first. Sets (discard, beliefs) are sorted. The belief fields, last_move, last_player, round and humans are optional.
+# Games that do not use durak.DEFAULT_CONFIG start with a deck=suits,ranks,hand_size field (after v).
+
+def cardText(card : Card, config : GameConfig = DEFAULT_CONFIG) -> str:
+    return rankChars(config)[card.rank] + suitChars(config)[card.suit]
+
+
+def cardsText(cards, ordered : bool = True, config : GameConfig = DEFAULT_CONFIG) -> str:
+    """
+    :param cards: cards to write
+    :param ordered: keep the order of cards (lists), or sort them (sets)
+    :param config: configuration the cards belong to
+    :rtype: str
+    """
+    if not ordered:
+        cards = sorted(cards, key = lambda c: (c.suit, c.rank))
+    return ''.join(cardText(c, config) for c in cards) if len(cards) > 0 else '-'
+
+
+def toNotation(game : TransferDurak) -> str:
+    """
+    Writes down the full state of game, including every player's beliefs.
+
+    :param game: game to write
+    :type game: TransferDurak
+    :return: one line of text, read back by fromNotation
+    :rtype: str
+    """
+    numbers = game.player_numbers
+    config = game.config
+    fields = [f'v={NOTATION_VERSION}']
+    if config is not DEFAULT_CONFIG:
+        fields.append(f'deck={config.suits},{config.ranks},{config.hand_size}')
+    fields += [
+        f'trump={suitChars(config)[game.trump]}',
+        f'players={",".join(str(n) for n in numbers)}',
+        f'attacker={numbers[game.attacker_pos]}',
+        f'defender={numbers[game.defender_pos]}',
+        f'turn={"a" if game.is_attacker_move else "d"}',
+        f'eating={1 if game.defender_eating else 0}',
+        f'round={game.round}',
+        f'talon={cardsText(game.talon, config = config)}',
+    ]
+    fields += [f'hand{n}={cardsText(p.hand, config = config)}' for n, p in zip(numbers, game.players)]
+    fields += [
+        f'attack={cardsText(game.attack_cards, config = config)}',
+        f'defense={cardsText(game.defense_cards, config = config)}',
+        f'last_attack={cardsText(game.last_attack, config = config)}',
+        f'last_defense={cardsText(game.last_defense, config = config)}',
+        f'discard={cardsText(game.discard, ordered = False, config = config)}',
+    ]
+    for n, p in zip(numbers, game.players):
+        fields.append(f'beliefs{n}=' + ','.join(f'{m}:{cardsText(b, ordered = False, config = config)}' for m, b in zip(numbers, p.hand_beliefs)))
+        fields.append(f'talon_belief{n}={cardsText(p.talon_belief, ordered = False, config = config)}')
+    humans = [n for n, p in zip(numbers, game.players) if type(p) is HumanPlayer]
+    if len(humans) > 0:
+        fields.append(f'humans={",".join(str(n) for n in humans)}')
+    if game.last_move is not None:
+        fields.append(f'last_move={game.last_move[0]}:{cardsText(game.last_move[1], config = config)}')
+    if game.last_player is not None:
+        fields.append(f'last_player={game.last_player}')
+    return ' '.join(fields)
+
+###################################################################
+#                            Parser                               #
+###################################################################
+
+def parseCards(text : str, config : GameConfig = DEFAULT_CONFIG) -> list[Card]:
+    """
+    Reads a card list written by cardsText.
+
+    :param text: card list, or '-' for no cards
+    :param config: configuration the cards belong to
+    :rtype: list[Card]
+    """
+    if text == '-':
+        return []
+    if len(text) % 2 != 0:
+        raise ValueError(f'malformed card list {text!r}')
+    rank_chars, suit_chars = rankChars(config), suitChars(config)
+    cards = []
+    for i in range(0, len(text), 2):
+        if text[i] not in rank_chars or text[i + 1] not in suit_chars:
+            raise ValueError(f'unknown card {text[i:i + 2]!r}')
+        cards.append(config.card(rank_chars.index(text[i]), suit_chars.index(text[i + 1])))
+    return cards
+
+
+def fromNotation(text : str) -> TransferDurak:
+    """
+    Builds the game written down by toNotation (or by hand).
+    Missing belief fields are derived: nobody knows any opponent card, and every card a player has not seen may be in the talon.
+
+    :param text: position in the notation
+    :type text: str
+    :raises ValueError: if the text is malformed or the cards do not add up to one full deck
+    :rtype: TransferDurak
+    """
+    fields = {}
+    for token in text.split():
+        key, sep, value = token.partition('=')
+        if sep == '' or key in fields:
+            raise ValueError(f'malformed or repeated field {token!r}')
+        fields[key] = value
+    if int(fields.get('v', NOTATION_VERSION)) != NOTATION_VERSION:
+        raise ValueError(f'notation version {fields["v"]} is not supported (expected {NOTATION_VERSION})')
+
+    game = TransferDurak.__new__(TransferDurak)
+    game.config = config = GameConfig.get(*(int(n) for n in fields['deck'].split(','))) if 'deck' in fields else DEFAULT_CONFIG
+    numbers = [int(n) for n in fields['players'].split(',')]
+    humans = {int(n) for n in fields['humans'].split(',')} if 'humans' in fields else set()
+    game.player_numbers = numbers
+    game.indexSeats()
+    game.players = []
+    for n in numbers:
+        p = (HumanPlayer if n in humans else Player).__new__(HumanPlayer if n in humans else Player) # Player() would shuffle a deck
+        p.game = game
+        p.position = n
+        p.hand = parseCards(fields[f'hand{n}'], config)
+        game.players.append(p)
+    game.trump = suitChars(config).index(fields['trump'])
+    game.attacker_pos = numbers.index(int(fields['attacker']))
+    game.defender_pos = numbers.index(int(fields['defender'])) if 'defender' in fields else (game.attacker_pos + 1) % len(numbers)
+    game.is_attacker_move = fields.get('turn', 'a') == 'a'
+    game.defender_eating = fields.get('eating', '0') == '1'
+    game.round = int(fields.get('round', 0))
+    game.talon = parseCards(fields['talon'], config)
+    game.attack_cards = parseCards(fields.get('attack', '-'), config)
+    game.defense_cards = parseCards(fields.get('defense', '-'), config)
+    game.last_attack = parseCards(fields.get('last_attack', '-'), config)
+    game.last_defense = parseCards(fields.get('last_defense', '-'), config)
+    game.discard = set(parseCards(fields.get('discard', '-'), config))
+    game.last_move_str = ''
+    game.last_move = None
+    if 'last_move' in fields:
+        a_type, _, cards = fields['last_move'].partition(':')
+        game.last_move = (a_type, tuple(parseCards(cards, config)))
+    game.last_player = int(fields['last_player']) if 'last_player' in fields else None
+
+    # every card must be somewhere, exactly once
+    located = game.talon + game.attack_cards + game.defense_cards + list(game.discard) + [c for p in game.players for c in p.hand]
+    if len(located) != len(set(located)) or len(located) != config.num_cards:
+        raise ValueError(f'the position holds {len(set(located))} distinct cards in {len(located)} places, expected a full deck of {config.num_cards}')
+
+    public = game.discard | set(game.attack_cards) | set(game.defense_cards)
+    for n, p in zip(numbers, game.players):
+        p.hand_beliefs = [set() for m in numbers]
+        if f'beliefs{n}' in fields:
+            for entry in fields[f'beliefs{n}'].split(','):
+                m, _, cards = entry.partition(':')
+                p.hand_beliefs[numbers.index(int(m))] = set(parseCards(cards, config))
+        if f'talon_belief{n}' in fields:
+            p.talon_belief = set(parseCards(fields[f'talon_belief{n}'], config))
+        else:
+            known = set(p.hand) | public
+            for belief in p.hand_beliefs:
+                known |= belief
+            p.talon_belief = set(config.cards) - known
+    return game
+
+###################################################################
+#                         Position Corpus                         #
+###################################################################
+
+def saveCorpus(positions : list[TransferDurak], path : str = CORPUS_FILE, header : str = None):
+    """
+    Writes positions to a corpus file, one per line.
+
+    :param positions: positions to write
+    :param path: corpus file
+    :param header: comment written at the top of the file (lines starting with #), or None
+    """
+    with open(path, 'w') as file:
+        if header is not None:
+            for line in header.splitlines():
+                file.write(f'# {line}\n')
+        for game in positions:
+            file.write(toNotation(game) + '\n')
+
+
+def loadCorpus(path : str = CORPUS_FILE) -> list[TransferDurak]:
+    """
+    Reads the positions of a corpus file, skipping blank lines and # comments.
+
+    :param path: corpus file
+    :rtype: list[TransferDurak]
+    """
+    with open(path) as file:
+        return [fromNotation(line) for line in file if line.strip() != '' and not line.startswith('#')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Prints the positions of a corpus file.')
+    parser.add_argument('path', nargs = '?', default = CORPUS_FILE, help = 'corpus file')
+    parser.add_argument('--index', type = int, default = 0, help = 'position to show')
+    args = parser.parse_args()
+
+    positions = loadCorpus(args.path)
+    game = positions[args.index]
+    print(f'{len(positions)} positions, showing position {args.index}:')
+    print(toNotation(game))
+    game.showOmniscient()
@@ -0,0 +1,186 @@
+from durak import TransferDurak
+from search import Node
+from search import simulatePlayout
+from search import rewardVector
+import threading
+import random
+import time
+import sys
+
+###################################################################
+#                       Global Constants                          #
+###################################################################
+
+VIRTUAL_LOSS : float = 1.0 # visits (and losses) temporarily added to every node on a branch being searched by another thread
+NUM_LOCK_STRIPES : int = 64 # nodes are guarded by one of this many locks (picked by node id), so nodes need no lock of their own
+
+###################################################################
+#                   Tree-Parallel Monte Carlo Search              #
+###################################################################
+
+class SharedTree:
+    def __init__(self, s : TransferDurak, num_iterations = None, time_limit = None, playout_depth = None, playout_policy = None):
+        """
+        Search tree shared by the worker threads of parallelMCTS.
+
+        :param s: The game state to search from.
+        :type s: TransferDurak
+        :param num_iterations: Maximum number of iterations over all threads, or None if using time constraint.
+        :param time_limit: Maximum time to search for, or None if using iteration constraint.
+        :param playout_depth: Maximum number of plies per playout, or None for full-length playouts.
+        :param playout_policy: Learned playout policy, or None to use player.chooseActionHeuristic.
+        """
+        self.state = s
+        self.root = Node(action = 'root' if s.last_move is None else s.last_move, parent = None, player = s.last_player)
+        self.locks = [threading.Lock() for i in range(NUM_LOCK_STRIPES)]
+        self.counter_lock = threading.Lock()
+        self.iterations = 0
+        self.num_iterations = num_iterations
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.playout_depth = playout_depth
+        self.playout_policy = playout_policy
+
+
+    def lock(self, node : Node) -> threading.Lock:
+        return self.locks[id(node) % NUM_LOCK_STRIPES]
+
+
+    def claimIteration(self) -> bool:
+        """
+        Reserves one iteration of the budget for the calling thread.
+
+        :return: False once the iteration or time budget is used up
+        :rtype: bool
+        """
+        with self.counter_lock:
+            if self.deadline is not None:
+                if time.perf_counter() >= self.deadline:
+                    return False
+            elif self.iterations >= self.num_iterations:
+                return False
+            self.iterations += 1
+            return True
+
+
+    def descend(self) -> tuple[list[Node], TransferDurak]:
+        """
+        Selects and expands one leaf, adding a virtual loss to every node on the way so that other threads spread out over the tree.
+
+        :return: the branch from the root to the new leaf, and the state at the leaf
+        :rtype: tuple[list[Node], TransferDurak]
+        """
+        state = TransferDurak(self.state)
+        node = self.root
+        with self.lock(node):
+            node.N += VIRTUAL_LOSS # keeps the root visit count positive for UCB1 before the first update
+            node.U -= VIRTUAL_LOSS
+        branch = [node]
+        while not state.isTerminal():
+            possible_actions = state.actions() # computed outside the lock, the state at a node never changes
+            with self.lock(node):
+                if len(node.children) < len(possible_actions): # expand
+                    visited_actions = {c.action for c in node.children}
+                    a = random.choice([a for a in possible_actions if a not in visited_actions])
+                    child = Node(action = a, parent = node, player = state.getCurrentPlayerNumber())
+                    node.children.append(child)
+                    expanded = True
+                else: # select
+                    child = max(node.children, key = lambda c: c.UCB1())
+                    expanded = False
+            with self.lock(child):
+                child.N += VIRTUAL_LOSS
+                child.U -= VIRTUAL_LOSS
+            state.transition(child.action)
+            branch.append(child)
+            node = child
+            if expanded:
+                break
+        return branch, state
+
+
+    def update(self, branch : list[Node], rewards : list[float]):
+        """
+        Removes the virtual losses added by descend and backpropagates the playout result along branch.
+
+        :param branch: the branch returned by descend
+        :type branch: list[Node]
+        :param rewards: reward of every player, indexed by player number (search.rewardVector)
+        :type rewards: list[float]
+        """
+        for node in branch:
+            with self.lock(node):
+                node.N -= VIRTUAL_LOSS
+                node.U += VIRTUAL_LOSS
+                if node.parent is not None: # the root's value is never read, only its visits
+                    node.U += rewards[node.player]
+                node.N += 1
+
+
+    def work(self):
+        """
+        Worker thread loop: descend, play out, update, until the budget runs out.
+        """
+        while self.claimIteration():
+            branch, state = self.descend()
+            loser = simulatePlayout(state, max_depth = self.playout_depth, policy = self.playout_policy)
+            self.update(branch, rewardVector(self.state.numSeats(), loser))
+
+
+def parallelSearchTree(s : TransferDurak, num_threads : int = 4, num_iterations = None, time_limit = None, playout_depth = None, playout_policy = None) -> Node:
+    """
+    Grows one Monte Carlo search tree from state s with num_threads threads.
+    On free-threaded CPython builds the threads run in parallel; with the GIL they interleave and throughput stays about the same as MCTS.
+
+    :param s: The game state to search from.
+    :type s: TransferDurak
+    :param num_threads: Number of worker threads sharing the tree.
+    :type num_threads: int
+    :param num_iterations: Maximum number of iterations over all threads, or None if using time constraint.
+    :param time_limit: Maximum time to search for, or None if using iteration constraint.
+    :param playout_depth: Maximum number of plies per playout, or None for full-length playouts.
+    :param playout_policy: Learned playout policy, or None to use player.chooseActionHeuristic.
+    :return: The root of the search tree.
+    :rtype: Node
+    """
+    # input control
+    if num_iterations is None and time_limit is None:
+        raise ValueError('one of num_iterations or time_limit must not be None')
+    if num_iterations is not None and time_limit is not None:
+        raise ValueError('one of num_iterations and time_limit must be None')
+
+    tree = SharedTree(s, num_iterations, time_limit, playout_depth, playout_policy)
+    threads = [threading.Thread(target = tree.work) for i in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return tree.root
+
+
+def parallelMCTS(s : TransferDurak, num_threads : int = 4, num_iterations = None, time_limit = None, playout_depth = None, playout_policy = None):
+    """
+    Tree-parallel Monte Carlo tree search. Takes the same budget arguments as search.MCTS.
+
+    :param s: The game state to search from.
+    :type s: TransferDurak
+    :param num_threads: Number of worker threads sharing the tree.
+    :type num_threads: int
+    :return: The most visited action at the root, or the only legal action if the search expanded nothing.
+    :raises ValueError: if s is terminal, or the budget ran out before the root was expanded and s has several actions.
+    """
+    if s.isTerminal():
+        raise ValueError('cannot search a finished game')
+    root = parallelSearchTree(s, num_threads, num_iterations, time_limit, playout_depth, playout_policy)
+    if len(root.children) == 0:
+        actions = s.actions()
+        if len(actions) == 1:
+            return actions[0]
+        raise ValueError(f'the search budget ran out before any of the {len(actions)} root actions was expanded')
+    return max(root.children, key = lambda c: c.N).action
+
+
+def isFreeThreaded() -> bool:
+    """
+    Returns True if the interpreter is running without the GIL.
+    """
+    return hasattr(sys, '_is_gil_enabled') and not sys._is_gil_enabled()
@@ -0,0 +1,143 @@
+from durak import TransferDurak
+from benchmark import endgamePosition
+import argparse
+import time
+import sys
+
+###################################################################
+#                       Global Constants                          #
+###################################################################
+
+ACTION_TYPES : str = 'aprbetd' # attack, pass, ride, block, eat, transfer, defend
+
+# node counts of the current engine, used by --verify as a move generation oracle
+# (seed, talon, depth): nodes at each ply 1..depth
+PERFT_REFERENCE : dict[tuple, list[int]] = {
+    (0, 4, 4): [8, 46, 81, 890],
+    (3, 10, 3): [6, 33, 63],
+    (1, 0, 6): [6, 19, 35, 75, 200, 301], # reaches terminal positions, so removeOutPlayers is exercised
+    (2, 0, 6): [10, 51, 75, 328, 1204, 2205],
+}
+
+###################################################################
+#                        Perft Functions                          #
+###################################################################
+
+def playMove(state : TransferDurak, a : tuple) -> TransferDurak:
+    """
+    Returns a copy of state after action a, played the way the game loop plays it (restocking hands when a round ends).
+
+    :param state: position to move from
+    :type state: TransferDurak
+    :param a: legal action in state
+    :type a: tuple
+    :rtype: TransferDurak
+    """
+    child = TransferDurak(state)
+    child.play(a)
+    return child
+
+
+class PerftResult:
+    def __init__(self, depth : int):
+        """
+        Counts gathered by perft.
+
+        :param depth: search depth
+        :type depth: int
+        """
+        self.nodes = [0] * depth # nodes[k] is the number of positions reached after k + 1 plies
+        self.terminal = [0] * depth # terminal[k] is how many of those positions have a durak
+        self.types = [{t: 0 for t in ACTION_TYPES} for i in range(depth)] # types[k][t] is the number of type t actions played at ply k + 1
+
+    def total(self) -> int:
+        return sum(self.nodes)
+
+
+def perft(state : TransferDurak, depth : int, result : PerftResult = None, ply : int = 0, prune_equivalent : bool = False) -> PerftResult:
+    """
+    Enumerates every action sequence of up to depth plies from state with actions() and transition, counting the positions reached.
+    Terminal positions are counted but not expanded.
+
+    :param state: position to enumerate from. It is not modified.
+    :type state: TransferDurak
+    :param depth: number of plies to enumerate
+    :type depth: int
+    :param prune_equivalent: collapse actions that only differ by equivalent cards
+    :type prune_equivalent: bool
+    :rtype: PerftResult
+    """
+    if result is None:
+        result = PerftResult(depth)
+    if ply == depth or state.isTerminal():
+        return result
+    for a in state.actions(prune_equivalent):
+        child = playMove(state, a)
+        result.nodes[ply] += 1
+        result.types[ply][a[0]] += 1
+        if child.isTerminal():
+            result.terminal[ply] += 1
+        perft(child, depth, result, ply + 1, prune_equivalent)
+    return result
+
+
+def perftDivide(state : TransferDurak, depth : int, prune_equivalent : bool = False) -> dict[tuple, int]:
+    """
+    Returns the total number of positions reached below each root action, for narrowing down where two engines disagree.
+
+    :param state: position to enumerate from
+    :type state: TransferDurak
+    :param depth: number of plies to enumerate (including the root action)
+    :type depth: int
+    :param prune_equivalent: collapse actions that only differ by equivalent cards
+    :type prune_equivalent: bool
+    :rtype: dict[tuple, int]
+    """
+    return {a: 1 + perft(playMove(state, a), depth - 1, prune_equivalent = prune_equivalent).total() for a in state.actions(prune_equivalent)}
+
+
+def verify() -> bool:
+    """
+    Checks perft against PERFT_REFERENCE.
+
+    :return: True if every reference position matches
+    :rtype: bool
+    """
+    passed = True
+    for (seed, talon, depth), expected in PERFT_REFERENCE.items():
+        nodes = perft(endgamePosition(seed, talon), depth).nodes
+        if nodes != expected:
+            passed = False
+        print(f'seed {seed}, talon {talon}, depth {depth}: {nodes} {"ok" if nodes == expected else f"MISMATCH (expected {expected})"}')
+    return passed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Counts the positions reachable from a seeded position within a number of plies.')
+    parser.add_argument('--seed', type = int, default = 0, help = 'seed of the heuristic game the position is taken from')
+    parser.add_argument('--talon', type = int, default = 4, help = 'take the first position with at most this many cards in the talon')
+    parser.add_argument('--depth', type = int, default = 4, help = 'number of plies to enumerate')
+    parser.add_argument('--by-type', action = 'store_true', help = 'break the counts down by action type')
+    parser.add_argument('--divide', action = 'store_true', help = 'print the counts below each root action')
+    parser.add_argument('--verify', action = 'store_true', help = 'check the engine against the reference counts')
+    parser.add_argument('--prune', action = 'store_true', help = 'collapse actions that only differ by equivalent cards (actions(prune_equivalent = True))')
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(0 if verify() else 1)
+
+    state = endgamePosition(args.seed, args.talon)
+    if state is None:
+        sys.exit(f'the game with seed {args.seed} ends before the talon has {args.talon} cards')
+    if args.divide:
+        for a, count in perftDivide(state, args.depth, args.prune).items():
+            print(f'{a}: {count}')
+    start = time.perf_counter()
+    result = perft(state, args.depth, prune_equivalent = args.prune)
+    elapsed = time.perf_counter() - start
+    for ply in range(args.depth):
+        line = f'ply {ply + 1}: {result.nodes[ply]} nodes, {result.terminal[ply]} terminal'
+        if args.by_type:
+            line += ', ' + ', '.join(f'{t}: {n}' for t, n in result.types[ply].items() if n > 0)
+        print(line)
+    print(f'{result.total()} nodes in {elapsed:.2f}s ({result.total() / elapsed:.0f} nodes/sec)')
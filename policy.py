@@ -0,0 +1,216 @@
+from durak import TransferDurak
+from durak import runGame
+from search import MCTS
+from search import hybridAction
+from search import ENDGAME_TALON
+import numpy as np
+import random
+import math
+
+###################################################################
+#                       Global Constants                          #
+###################################################################
+
+ACTION_TYPES : str = 'aprbetd' # attack, pass, ride, block, eat, transfer, defend
+NUM_ACTION_FEATURES : int = 7 # bias, cards, max plain rank, trumps, max trump rank, talon size, hand size
+
+POLICY_FILE : str = 'policy.npz' # default location of the trained playout policy
+NUM_TRAINING_PLAYOUTS : int = 200 # number of playouts MCTS does per training position
+
+###################################################################
+#                        Action Features                          #
+###################################################################
+
+def actionFeatures(game : TransferDurak, player, action : tuple) -> list[float]:
+    """
+    Cheap features of an action for the learned playout policy.
+
+    :param game: game the action is played in
+    :type game: TransferDurak
+    :param player: player taking the action
+    :param action: action to describe
+    :type action: tuple
+    :return: list of NUM_ACTION_FEATURES features
+    :rtype: list[float]
+    """
+    a_type, cards = action
+    ranks, hand_size = game.config.ranks, game.config.hand_size
+    max_rank = -1
+    max_trump_rank = -1
+    num_trumps = 0
+    for card in cards:
+        if card.suit == game.trump:
+            num_trumps += 1
+            if card.rank > max_trump_rank:
+                max_trump_rank = card.rank
+        elif card.rank > max_rank:
+            max_rank = card.rank
+    return [1.0, len(cards), (max_rank + 1) / ranks, num_trumps, (max_trump_rank + 1) / ranks, len(game.talon) / hand_size, len(player.hand) / hand_size]
+
+###################################################################
+#                     Playout Policy Class                        #
+###################################################################
+
+class PlayoutPolicy:
+    def __init__(self, weights, temperature : float = 0.0):
+        """
+        Softmax playout policy over linear action scores. Each action type has its own row of feature weights.
+
+        :param weights: table of shape (len(ACTION_TYPES), NUM_ACTION_FEATURES)
+        :param temperature: softmax temperature. 0 (the default, and as cheap per step as chooseActionHeuristic) always plays the highest scoring action
+        :type temperature: float
+        """
+        # plain python lists are faster than numpy for the handful of actions scored each step
+        self.weights = {t: [float(w) for w in weights[i]] for i, t in enumerate(ACTION_TYPES)}
+        self.temperature = temperature
+
+
+    @classmethod
+    def load(cls, path : str = POLICY_FILE, temperature : float = 0.0):
+        """
+        Loads a policy saved by PlayoutPolicy.save.
+
+        :param path: path to the .npz file
+        :type path: str
+        :param temperature: softmax temperature
+        :type temperature: float
+        """
+        return cls(np.load(path)['weights'], temperature)
+
+
+    def save(self, path : str = POLICY_FILE):
+        """
+        Saves the weight table to an .npz file.
+
+        :param path: path to the .npz file
+        :type path: str
+        """
+        np.savez(path, weights = self.table())
+
+
+    def table(self) -> np.ndarray:
+        return np.array([self.weights[t] for t in ACTION_TYPES])
+
+
+    def score(self, game : TransferDurak, player, action : tuple) -> float:
+        """
+        Linear score of action. Equivalent to the dot product of its weight row with actionFeatures, inlined because it runs every playout step.
+        """
+        a_type, cards = action
+        w = self.weights[a_type]
+        config = game.config
+        score = w[0] + w[5] * len(game.talon) / config.hand_size + w[6] * len(player.hand) / config.hand_size
+        if len(cards) == 0:
+            return score
+        max_rank = -1
+        max_trump_rank = -1
+        num_trumps = 0
+        for card in cards:
+            if card.suit == game.trump:
+                num_trumps += 1
+                if card.rank > max_trump_rank:
+                    max_trump_rank = card.rank
+            elif card.rank > max_rank:
+                max_rank = card.rank
+        return score + w[1] * len(cards) + w[2] * (max_rank + 1) / config.ranks + w[3] * num_trumps + w[4] * (max_trump_rank + 1) / config.ranks
+
+
+    def chooseAction(self, player) -> tuple:
+        """
+        Chooses an action for player, who must be the current player of their game.
+
+        :param player: Player instance
+        :return: the chosen action
+        :rtype: tuple
+        """
+        actions = player.actions()
+        if len(actions) == 1:
+            return actions[0]
+        scores = [self.score(player.game, player, a) for a in actions]
+        best = max(scores)
+        if self.temperature == 0:
+            return actions[scores.index(best)]
+        weights = [math.exp((s - best) / self.temperature) for s in scores]
+        return random.choices(actions, weights = weights)[0]
+
+###################################################################
+#                    Distillation From MCTS                       #
+###################################################################
+
+def visitData(num_games : int, num_iterations : int = NUM_TRAINING_PLAYOUTS, seed : int = 0, max_talon : int = ENDGAME_TALON) -> list[tuple]:
+    """
+    Plays hybrid self-play games and records the MCTS root visit distribution at every endgame decision with more than one action.
+
+    :param num_games: number of games to play
+    :type num_games: int
+    :param num_iterations: number of playouts MCTS does per decision
+    :type num_iterations: int
+    :param seed: seed of the first game. Game i uses seed + i
+    :type seed: int
+    :param max_talon: largest talon size of the recorded positions
+    :type max_talon: int
+    :return: list of (action type indices, action features, visit distribution) for every recorded decision
+    :rtype: list[tuple]
+    """
+    data = []
+
+    def search(game : TransferDurak) -> tuple:
+        # MCTS move that also records the decision
+        a, visits = MCTS(game, num_iterations = num_iterations, return_visits = True)
+        player = game.getCurrentPlayer()
+        types = np.array([ACTION_TYPES.index(b[0]) for b in visits])
+        features = np.array([actionFeatures(game, player, b) for b in visits])
+        counts = np.array(list(visits.values()))
+        data.append((types, features, counts / counts.sum()))
+        return a
+
+    for iter in range(num_games):
+        random.seed(seed + iter)
+        game = TransferDurak(num_players = 2, num_humans = 0)
+        runGame(game, lambda state: hybridAction(state, search, max_talon))
+    return data
+
+
+def trainPlayoutPolicy(data : list[tuple], epochs : int = 500, learning_rate : float = 1.0, seed : int = 0) -> PlayoutPolicy:
+    """
+    Fits the weight table by gradient descent on the cross-entropy between the policy's softmax and the MCTS visit distributions.
+
+    :param data: decisions recorded by visitData
+    :type data: list[tuple]
+    :param epochs: number of passes over the data
+    :type epochs: int
+    :param learning_rate: gradient descent step size
+    :type learning_rate: float
+    :param seed: seed for shuffling
+    :type seed: int
+    :rtype: PlayoutPolicy
+    """
+    rng = np.random.default_rng(seed)
+    W = np.zeros((len(ACTION_TYPES), NUM_ACTION_FEATURES))
+    for epoch in range(epochs):
+        grad = np.zeros_like(W)
+        for i in rng.permutation(len(data)):
+            types, features, target = data[i]
+            scores = np.einsum('ij,ij->i', W[types], features)
+            p = np.exp(scores - scores.max())
+            p /= p.sum()
+            np.add.at(grad, types, (p - target)[:, None] * features) # gradient of the cross-entropy wrt each row used
+        W -= learning_rate * grad / len(data)
+    return PlayoutPolicy(W)
+
+
+def crossEntropy(policy : PlayoutPolicy, data : list[tuple]) -> float:
+    W = policy.table()
+    total = 0.0
+    for types, features, target in data:
+        scores = np.einsum('ij,ij->i', W[types], features)
+        log_p = scores - scores.max() - np.log(np.exp(scores - scores.max()).sum())
+        total -= float((target * log_p).sum())
+    return total / len(data)
+
+
+if __name__ == '__main__':
+    data = visitData(200)
+    policy = trainPlayoutPolicy(data)
+    print(f'decisions: {len(data)}, cross-entropy: {crossEntropy(policy, data):.3f} (uniform: {crossEntropy(PlayoutPolicy(np.zeros_like(policy.table())), data):.3f})')
+    policy.save()
@@ -0,0 +1,90 @@
+from durak import TransferDurak
+from search import Node
+from search import NodePool
+from search import updateSearchTree
+from search import actionPrior
+from search import releaseTree
+import threading
+import random
+
+###################################################################
+#                         Ponderer Class                          #
+###################################################################
+
+class Ponderer:
+    def __init__(self, game : TransferDurak, should_ponder = None, node_pool : NodePool = None):
+        """
+        Searches the positions that can follow the current player's move in a background thread, while that player decides.
+        Call start() before the player decides and finish(a) with the action they chose.
+
+        :param game: game whose current player is about to move (usually a human). It is copied, never modified.
+        :type game: TransferDurak
+        :param should_ponder: function taking the state after a candidate move and returning True if the AI would search it,
+                              or None to ponder every position where another player moves next.
+        :param node_pool: NodePool the trees are allocated from, or None for unbounded trees.
+        """
+        player = game.getCurrentPlayer()
+        mover = game.getCurrentPlayerNumber()
+        ranked_actions = player.rankActions(player.actions()) # the moves a heuristic player is most likely to make come first
+
+        self.node_pool = node_pool
+        self.trees = {} # candidate action -> (root, state after the action)
+        self.weights = {} # candidate action -> share of the pondering time
+        for rank, a in enumerate(ranked_actions):
+            state = TransferDurak(game)
+
+            # play the candidate move exactly as main.humanPlay would
+            state.play(a)
+
+            if state.isTerminal() or state.getCurrentPlayerNumber() == mover:
+                continue
+            if should_ponder is not None and not should_ponder(state):
+                continue
+            if node_pool is not None:
+                root = node_pool.newNode(action = a, parent = None, player = state.last_player)
+            else:
+                root = Node(action = a, parent = None, player = state.last_player)
+            self.trees[a] = (root, state)
+            self.weights[a] = actionPrior(rank, len(ranked_actions))
+
+        self.iterations = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target = self.run, daemon = True)
+
+
+    def start(self):
+        if len(self.trees) > 0:
+            self.thread.start()
+
+
+    def run(self):
+        """
+        Background loop: grows the tree of a candidate move picked in proportion to its prior until stopped.
+        """
+        actions = list(self.trees)
+        weights = [self.weights[a] for a in actions]
+        while not self.stop_event.is_set():
+            a = random.choices(actions, weights = weights)[0]
+            root, state = self.trees[a]
+            updateSearchTree(root, state, pool = self.node_pool)
+            self.iterations += 1
+
+
+    def finish(self, a) -> Node:
+        """
+        Stops pondering, releases the trees of the moves that were not played and returns the tree for the move that was.
+        The caller owns the returned tree: pass it to MCTS as root, then free it with search.releaseTree(root).
+
+        :param a: the action the player chose
+        :return: root of the search tree of the position after a, or None if it was not pondered
+        :rtype: Node
+        """
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        root = self.trees[a][0] if a in self.trees else None
+        for b, (other, state) in self.trees.items():
+            if b != a:
+                releaseTree(other)
+        self.trees = {}
+        return root
@@ -0,0 +1,245 @@
+from tournament import wilsonInterval
+import sqlite3
+import pickle
+import json
+import time
+import os
+
+###################################################################
+#                       Global Constants                          #
+###################################################################
+
+RESULTS_DIR : str = 'trials' # directory holding the result store
+GAMES_FILE : str = 'games.jsonl' # append-only log of every game, one JSON object per line
+INDEX_FILE : str = 'games.sqlite' # SQLite index of GAMES_FILE, rebuilt from it whenever it falls behind
+
+# column name -> SQLite type of every recorded game
+COLUMNS : dict[str, str] = {
+    'run': 'TEXT',                      # free-form label of the experiment the game belongs to
+    'cell': 'TEXT',                     # content hash of the matchup configuration (see sweep.cellKey), NULL outside sweeps
+    'recorded_at': 'REAL',              # unix time the game was recorded
+    'matchup': 'TEXT',                  # matchup name, e.g. 'hybrid100 vs 1 heuristic'
+    'agent': 'TEXT',                    # name of the tested agent
+    'opponent': 'TEXT',                 # name of the agent filling the other seats
+    'num_players': 'INTEGER',
+    'budget': 'INTEGER',                # MCTS iterations per move of the tested agent, NULL if it does not search
+    'game': 'INTEGER',                  # index of the game within its matchup
+    'seed': 'INTEGER',
+    'rotation': 'INTEGER',              # seats the lineup was rotated by
+    'durak_seat': 'INTEGER',            # NULL for a draw (a game cut off after tournament.MAX_GAME_PLIES actions)
+    'durak_index': 'INTEGER',           # index of the durak in the lineup (num_players - 1 is the tested agent)
+    'agent_lost': 'INTEGER',            # 1 if the tested agent was the durak, NULL for a draw
+    'plies': 'INTEGER',                 # game length in actions
+    'seconds': 'REAL',                  # wall time of the game
+    'iterations': 'INTEGER',            # search iterations run by all agents
+    'search_seconds': 'REAL',           # time all agents spent searching
+    'iterations_per_second': 'REAL',    # iterations / search_seconds, NULL if nobody searched
+}
+
+###################################################################
+#                       Result Store Class                        #
+###################################################################
+
+class ResultStore:
+    def __init__(self, directory : str = RESULTS_DIR):
+        """
+        Append-only store of tournament games. Every game is appended to a JSONL file as soon as it finishes,
+        and indexed in SQLite for aggregate queries. The JSONL file is the source of truth: if the index misses
+        games (for example after a crash between the two writes), they are indexed again when the store is opened.
+
+        :param directory: directory holding the store, created if needed
+        :type directory: str
+        """
+        os.makedirs(directory, exist_ok = True)
+        self.games_path = os.path.join(directory, GAMES_FILE)
+        self.db = sqlite3.connect(os.path.join(directory, INDEX_FILE))
+        columns = ', '.join(f'{name} {sql_type}' for name, sql_type in COLUMNS.items())
+        self.db.execute(f'CREATE TABLE IF NOT EXISTS games ({columns})')
+        existing = {info[1] for info in self.db.execute('PRAGMA table_info(games)')}
+        for name, sql_type in COLUMNS.items(): # stores written before a column was added get it as NULL
+            if name not in existing:
+                self.db.execute(f'ALTER TABLE games ADD COLUMN {name} {sql_type}')
+        self.db.execute('CREATE INDEX IF NOT EXISTS games_by_cell ON games (cell, game)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS games_by_setting ON games (agent, opponent, num_players, budget)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS indexed (offset INTEGER)') # bytes of the JSONL file already indexed
+        if self.db.execute('SELECT COUNT(*) FROM indexed').fetchone()[0] == 0:
+            self.db.execute('INSERT INTO indexed VALUES (0)')
+        self.db.commit()
+        self.catchUp()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def close(self):
+        self.db.close()
+
+
+    def catchUp(self):
+        """
+        Indexes the lines of the JSONL file written after the last indexed one.
+        """
+        offset = self.db.execute('SELECT offset FROM indexed').fetchone()[0]
+        if not os.path.exists(self.games_path):
+            return
+        with open(self.games_path, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break # a write was cut off, the partial line is not a game
+                self.index(json.loads(line))
+                offset += len(line)
+        self.db.execute('UPDATE indexed SET offset = ?', (offset,))
+        self.db.commit()
+
+
+    def index(self, row : dict):
+        names = list(COLUMNS)
+        self.db.execute(f'INSERT INTO games ({", ".join(names)}) VALUES ({", ".join("?" * len(names))})', [row.get(name) for name in names])
+
+
+    def record(self, matchup, result, run : str = None, cell : str = None) -> dict:
+        """
+        Appends one game to the store.
+
+        :param matchup: tournament.Matchup the game belongs to
+        :param result: tournament.GameResult of the game
+        :param run: label of the experiment, or None
+        :param cell: content hash of the matchup configuration, or None
+        :return: the recorded row
+        :rtype: dict
+        """
+        durak_index = result.durakIndex(matchup.num_players)
+        row = {
+            'run': run,
+            'cell': cell,
+            'recorded_at': time.time(),
+            'matchup': matchup.name,
+            'agent': matchup.agent.name,
+            'opponent': matchup.opponent.name,
+            'num_players': matchup.num_players,
+            'budget': getattr(matchup.agent, 'num_iterations', None),
+            'game': result.game,
+            'seed': result.seed,
+            'rotation': result.rotation,
+            'durak_seat': result.durak_seat,
+            'durak_index': durak_index,
+            'agent_lost': None if durak_index is None else int(durak_index == matchup.num_players - 1),
+            'plies': result.plies,
+            'seconds': result.seconds,
+            'iterations': result.iterations,
+            'search_seconds': result.search_seconds,
+            'iterations_per_second': result.iterations / result.search_seconds if result.search_seconds > 0 else None,
+        }
+        self.append(row)
+        return row
+
+
+    def append(self, row : dict):
+        line = (json.dumps(row) + '\n').encode()
+        with open(self.games_path, 'ab') as file:
+            file.write(line)
+        self.index(row)
+        self.db.execute('UPDATE indexed SET offset = offset + ?', (len(line),))
+        self.db.commit()
+
+
+    def importPickle(self, path : str, agent : str, opponent : str, num_players : int = 2, budget : int = None, run : str = None):
+        """
+        Adds the games of a trial file written by the old test.py (a pickled list of durak indices) to the store.
+        Only the results are known, the other columns are left empty.
+
+        :param path: path of the .pkl file
+        :param agent: name of the tested agent, e.g. 'hybrid100'
+        :param opponent: name of the opponent, e.g. 'heuristic'
+        :param num_players: number of players per game
+        :param budget: MCTS iterations per move of the tested agent, or None
+        :param run: label of the experiment, defaults to the file name
+        """
+        with open(path, 'rb') as file:
+            duraks = pickle.load(file)
+        for i, d in enumerate(duraks):
+            self.append({'run': os.path.basename(path) if run is None else run, 'recorded_at': time.time(),
+                         'matchup': f'{agent} vs {num_players - 1} {opponent}', 'agent': agent, 'opponent': opponent,
+                         'num_players': num_players, 'budget': budget, 'game': i, 'durak_index': d,
+                         'agent_lost': int(d == num_players - 1)})
+
+
+    def completedGames(self, cell : str) -> set[int]:
+        """
+        :return: indices of the games recorded for cell
+        :rtype: set[int]
+        """
+        return {game for (game,) in self.db.execute('SELECT DISTINCT game FROM games WHERE cell = ?', (cell,))}
+
+
+    def where(self, filters : dict) -> tuple[str, list]:
+        for name in filters:
+            if name not in COLUMNS:
+                raise ValueError(f'unknown column {name}')
+        if len(filters) == 0:
+            return '', []
+        return 'WHERE ' + ' AND '.join(f'{name} IS ?' for name in filters), list(filters.values())
+
+
+    def rows(self, **filters):
+        """
+        Yields the recorded games matching filters (column = value) as dicts, one at a time.
+        """
+        clause, params = self.where(filters)
+        names = list(COLUMNS)
+        for values in self.db.execute(f'SELECT {", ".join(names)} FROM games {clause}', params):
+            yield dict(zip(names, values))
+
+
+    def summary(self, group_by : tuple = ('agent', 'opponent', 'num_players', 'budget'), **filters) -> list[dict]:
+        """
+        Aggregates the games matching filters, grouped by the group_by columns. Computed by SQLite, without loading the games.
+
+        :param group_by: columns to group by
+        :param filters: column = value conditions
+        :return: one dict per group with the group_by columns, games, draws, win_rate, win_rate_low, win_rate_high (95% Wilson interval),
+                 mean_plies, mean_seconds and iterations_per_second. Draws are not counted in games or the win rate.
+        :rtype: list[dict]
+        """
+        for name in group_by:
+            if name not in COLUMNS:
+                raise ValueError(f'unknown column {name}')
+        clause, params = self.where(filters)
+        keys = ', '.join(group_by)
+        query = (f'SELECT {keys + ", " if keys else ""}COUNT(agent_lost), COUNT(*) - COUNT(agent_lost), SUM(agent_lost), AVG(plies), AVG(seconds), '
+                 f'SUM(iterations) / SUM(search_seconds) FROM games {clause}'
+                 + (f' GROUP BY {keys} ORDER BY {keys}' if keys else ''))
+        summaries = []
+        for values in self.db.execute(query, params):
+            games, draws, losses, mean_plies, mean_seconds, iterations_per_second = values[len(group_by):]
+            if games == 0:
+                continue
+            low, high = wilsonInterval(games - losses, games)
+            summary = dict(zip(group_by, values))
+            summary.update({'games': games, 'draws': draws, 'win_rate': (games - losses) / games, 'win_rate_low': low, 'win_rate_high': high,
+                            'mean_plies': mean_plies, 'mean_seconds': mean_seconds, 'iterations_per_second': iterations_per_second})
+            summaries.append(summary)
+        return summaries
+
+
+    def winRate(self, **filters) -> float:
+        """
+        :return: fraction of the games matching filters that the tested agent did not lose, or None if there are none
+        """
+        summaries = self.summary(group_by = (), **filters)
+        return summaries[0]['win_rate'] if len(summaries) > 0 else None
+
+
+if __name__ == '__main__':
+    with ResultStore() as store:
+        for s in store.summary():
+            print(f'{s["agent"]} vs {s["num_players"] - 1} {s["opponent"]}: win rate {s["win_rate"]:.3f} '
+                  f'[{s["win_rate_low"]:.3f}, {s["win_rate_high"]:.3f}] over {s["games"]} games, '
+                  f'{s["mean_plies"] or 0:.1f} plies/game'
+                  + ('' if s['iterations_per_second'] is None else f', {s["iterations_per_second"]:.0f} iterations/sec'))
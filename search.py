@@ -1,7 +1,51 @@
 from durak import TransferDurak
+from durak import runGame
+from canonical import canonicalKey
+import threading
 import random
 import time
 import math
+import sys
+
+###################################################################
+#                         Global Constants                        #
+###################################################################
+
+# weights of the static evaluator used to score truncated playouts
+EVAL_HAND_WEIGHT : float = 1.0 # penalty for each card held in hand
+EVAL_CARD_WEIGHT : float = 1.0 # reward for each card, scaled by the fraction of live cards it beats
+EVAL_TRUMP_WEIGHT : float = 0.5 # extra reward for each trump card held
+EVAL_TEMPERATURE : float = 1.0 # larger values make the evaluator more confident in its durak prediction
+
+# progressive widening and prior-biased (PUCT) selection
+PW_C : float = 1.0 # a node with N visits may have ceil(PW_C * (N + 1) ** PW_ALPHA) children
+PW_ALPHA : float = 0.5
+PUCT_C : float = 1.5 # weight of the prior term in Node.PUCT
+PRIOR_DECAY : float = 0.7 # the i-th ranked action gets a prior proportional to PRIOR_DECAY ** i
+
+PRUNE_FRACTION : float = 0.1 # fraction of a NodePool's budget freed each time it fills up
+
+# phases timed by SearchStats, in report order
+PROFILE_PHASES : list[str] = ['clone', 'selection', 'expansion', 'actions', 'playout', 'sampleBelief', 'restockHands', 'evaluator', 'backprop']
+
+# profiling.stats is the SearchStats of the search step running in the calling thread, or unset when profiling is off (the default).
+# It is per thread so that threaded searches (parallel.py, ponder.py) never record into each other's stats
+profiling = threading.local()
+
+TIME_CHECK_SECONDS : float = 0.005 # time-limited searches read the clock about this often
+
+UCB_C : float = math.sqrt(2) # exploration constant of Node.UCB1
+
+# playout used by simulatePlayout when no learned policy is given: 'heuristic', 'random' or 'epsilon' (epsilonLowestActionPlayout)
+PLAYOUT : str = 'heuristic'
+
+RAVE_K : float = 250.0 # suggested RAVE equivalence parameter (visits at which AMAF and Monte Carlo values get equal weight)
+
+# full-length playouts still running after this many plies are scored like truncated ones. With 3 or more players the heuristic
+# endgame can cycle forever (attack, eat, attack, pass, block, ...) since an empty talon leaves it no random choices
+MAX_PLAYOUT_PLIES : int = 500
+
+ENDGAME_TALON : int = 4 # the hybrid agent (hybridAction) only searches once the talon has at most this many cards
 
 ###################################################################
 #        			       Node Class		      	              #
@@ -22,194 +66,847 @@ class Node:
         self.action = action
         self.children = []
         self.player = player
+        self.pool = None # NodePool that handed out this node, None if it was built directly
 
         self.N : float = 0.0
         self.U : float = 0.0
 
-    def UCB1(self) -> float:
+        # all-moves-as-first statistics: results of every simulation through the parent in which self.player played self.action later on
+        self.N_amaf : float = 0.0
+        self.U_amaf : float = 0.0
+
+        # used by progressive widening: prior probability of self.action, and the legal actions of this node in expansion order
+        self.P : float = 1.0
+        self.ranked_actions = None
+
+    def UCB1(self, rave_k = None) -> float:
         """
         Upper confidence bound for trees used in selecting nodes during MCTS.
         
         :param self: Description
+        :param rave_k: RAVE equivalence parameter (the number of visits at which the AMAF and Monte Carlo values are weighted equally), or None to ignore the AMAF statistics.
         :return: Description
         :rtype: float
         """
         if self.N == 0.0:
             return float('inf')
-        C = math.sqrt(2)
-        return self.U / self.N + C * math.sqrt(math.log(self.parent.N) / self.N)
+        return self.value(rave_k) + UCB_C * math.sqrt(math.log(self.parent.N) / self.N)
+
+    def PUCT(self, rave_k = None) -> float:
+        """
+        Prior-biased upper confidence bound used for selection with progressive widening.
+        
+        :param self: Description
+        :param rave_k: RAVE equivalence parameter, or None to ignore the AMAF statistics.
+        :rtype: float
+        """
+        exploration = PUCT_C * self.P * math.sqrt(self.parent.N) / (1 + self.N)
+        if self.N == 0.0:
+            return exploration
+        return self.value(rave_k) + exploration
+
+    def value(self, rave_k = None) -> float:
+        """
+        Mean reward of the node, blended with its AMAF value when rave_k is given. Only call on visited nodes.
+        
+        :param self: Description
+        :param rave_k: RAVE equivalence parameter, or None to ignore the AMAF statistics.
+        :rtype: float
+        """
+        value = self.U / self.N
+        if rave_k is not None and self.N_amaf > 0:
+            beta = math.sqrt(rave_k / (3 * self.N + rave_k)) # weight on the AMAF value decays as the node gets visited
+            value = (1 - beta) * value + beta * self.U_amaf / self.N_amaf
+        return value
+
+###################################################################
+#        			     Node Pool Class		      	              #
+###################################################################
+
+class NodePool:
+    def __init__(self, budget : int, prune_fraction : float = PRUNE_FRACTION):
+        """
+        Bounds the number of live nodes in a search tree and recycles the nodes of pruned subtrees.
+        A pool may be reused across searches so that long-running sessions keep a flat memory footprint.
+        
+        :param self: Description
+        :param budget: maximum number of live nodes
+        :type budget: int
+        :param prune_fraction: fraction of the budget that is freed each time the budget is reached
+        :type prune_fraction: float
+        """
+        self.budget = budget
+        self.prune_fraction = prune_fraction
+        self.live = 0 # number of nodes currently in a tree
+        self.free = [] # released nodes waiting to be reused
+        self.num_pruned = 0 # total number of nodes released by prune
+        self.peak = 0 # largest number of live nodes seen
+
+        # approximate size of a node with no children, measured once
+        sample = Node(action = None, parent = None, player = None)
+        self.node_bytes = sys.getsizeof(sample) + sys.getsizeof(sample.__dict__) + sys.getsizeof(sample.children)
+
+    def newNode(self, action, parent, player : int) -> Node:
+        """
+        Returns a node from the free list (or a new one if it is empty) initialized like Node(action, parent, player).
+        """
+        self.live += 1
+        self.peak = max(self.peak, self.live)
+        if len(self.free) > 0:
+            node = self.free.pop()
+            node.__init__(action, parent, player)
+        else:
+            node = Node(action, parent, player)
+        node.pool = self
+        return node
+
+    def isFull(self) -> bool:
+        return self.live >= self.budget
+
+    def release(self, node : Node):
+        """
+        Detaches node from its parent and frees it and all its descendants with releaseTree. Only nodes this pool handed out
+        return to its free list, so a tree that mixes in nodes built elsewhere (e.g. a pondered root grown by a pooled search) keeps live exact.
+        """
+        releaseTree(node)
+
+
+    def recycle(self, node : Node):
+        # called by releaseTree for an unlinked node this pool handed out
+        node.pool = None
+        self.free.append(node)
+        self.live -= 1
+
+    def prune(self, root : Node) -> bool:
+        """
+        Releases the least-visited subtrees below the children of root until prune_fraction of the budget is free.
+        The children of the root are kept, since they are needed to choose the final action.
+        
+        :param root: root of the search tree
+        :type root: Node
+        :return: True if any node was released
+        :rtype: bool
+        """
+        candidates = []
+        stack = [c for c in root.children]
+        while len(stack) > 0:
+            n = stack.pop()
+            candidates += n.children
+            stack += n.children
+        candidates.sort(key = lambda n: n.N)
+        target = self.budget * (1 - self.prune_fraction)
+        live_before = self.live
+        for n in candidates:
+            if self.live <= target:
+                break
+            if n.parent is None: # already released with one of its ancestors
+                continue
+            self.release(n)
+        self.num_pruned += live_before - self.live
+        return self.live < live_before
+
+    def memoryEstimate(self) -> int:
+        """
+        Approximate number of bytes used by the live nodes (excluding cached actions and the actions themselves, which are shared with the game).
+        """
+        return self.live * self.node_bytes
+
+    def report(self) -> str:
+        return f'{self.live}/{self.budget} live nodes (~{self.memoryEstimate() / 1e6:.1f} MB), peak {self.peak}, {len(self.free)} free, {self.num_pruned} pruned'
+
+###################################################################
+#        			    Search Stats Class		      	              #
+###################################################################
+
+class SearchStats:
+    def __init__(self):
+        """
+        Time and call counts of the phases of a search, filled in while it is the active stats object of a thread (see currentStats).
+        Phases nest: actions is part of selection and expansion, and sampleBelief and restockHands are part of playout.
+        
+        :param self: Description
+        """
+        self.times = {phase: 0.0 for phase in PROFILE_PHASES}
+        self.calls = {phase: 0 for phase in PROFILE_PHASES}
+        self.playout_steps = 0
+        self.iterations = 0
+        self.elapsed = 0.0
+        self.tree_depth = 0
+        self.num_nodes = 0
+        self.branching_factor = 0.0
+
+    def call(self, phase : str, f, *args):
+        """
+        Calls f(*args), adding its running time to phase.
+        """
+        start = time.perf_counter()
+        result = f(*args)
+        self.times[phase] += time.perf_counter() - start
+        self.calls[phase] += 1
+        return result
+
+    def recordTree(self, root : Node):
+        """
+        Records the depth, size and mean branching factor (over nodes with children) of the search tree.
+        """
+        self.tree_depth = treeDepth(root)
+        self.num_nodes = 0
+        internal_nodes = 0
+        edges = 0
+        stack = [root]
+        while len(stack) > 0:
+            n = stack.pop()
+            self.num_nodes += 1
+            if len(n.children) > 0:
+                internal_nodes += 1
+                edges += len(n.children)
+            stack += n.children
+        self.branching_factor = edges / internal_nodes if internal_nodes > 0 else 0.0
+
+    def report(self) -> str:
+        """
+        Multi-line summary of the stats, suitable for logs.
+        """
+        lines = [f'{self.iterations} iterations in {self.elapsed:.3f}s ({self.iterations / max(self.elapsed, 1e-9):.0f}/s)']
+        for phase in PROFILE_PHASES:
+            if self.calls[phase] == 0:
+                continue
+            share = 100 * self.times[phase] / max(self.elapsed, 1e-9)
+            lines.append(f'  {phase:<13} {self.calls[phase]:>8} calls {1e3 * self.times[phase]:>10.1f} ms {1e6 * self.times[phase] / self.calls[phase]:>9.1f} us/call {share:>5.1f}%')
+        mean_length = self.playout_steps / self.calls['playout'] if self.calls['playout'] > 0 else 0.0
+        lines.append(f'  mean playout length {mean_length:.1f} plies, tree: {self.num_nodes} nodes, depth {self.tree_depth}, branching factor {self.branching_factor:.2f}')
+        return '\n'.join(lines)
+
+
+def currentStats() -> SearchStats:
+    """
+    :return: SearchStats of the search step running in this thread, or None when it is not profiled
+    :rtype: SearchStats
+    """
+    return getattr(profiling, 'stats', None)
 
 ###################################################################
 #               Monte Carlo Tree Search Functions                 #
 ###################################################################
 
-def selectNode(root: Node, state : TransferDurak) -> tuple[Node, TransferDurak]:
+def selectNode(root: Node, state : TransferDurak, rave_k = None, widening : bool = False, prune_equivalent : bool = False) -> tuple[Node, TransferDurak]:
     # choose the root if its terminal
 	if state.isTerminal():
 		return root, state
+	stats = currentStats()
+
+	if widening:
+		# stop if node may still add children (actions are ranked once per node, since the state at a node never changes)
+		if root.ranked_actions is None:
+			possible_actions = state.actions(prune_equivalent) if stats is None else stats.call('actions', state.actions, prune_equivalent)
+			root.ranked_actions = state.getCurrentPlayer().rankActions(possible_actions)
+		if len(root.children) < widenedChildCount(root):
+			return root, state
+		best_child = max(root.children, key = lambda c: c.PUCT(rave_k))
+	else:
+		# stop if node not fully expanded
+		possible_actions = state.actions(prune_equivalent) if stats is None else stats.call('actions', state.actions, prune_equivalent)
+		if len(root.children) < len(possible_actions):
+			return root, state
 
-    # stop if node not fully expanded
-	possible_actions = state.actions()
-	if len(root.children) < len(possible_actions):
-		return root, state
-
-	# recursively select best UCB child
-	best_child = max(root.children, key = lambda c: c.UCB1())
+		# recursively select best UCB child
+		best_child = max(root.children, key = lambda c: c.UCB1(rave_k))
 	state.transition(best_child.action)
-	return selectNode(best_child, state)
+	return selectNode(best_child, state, rave_k, widening, prune_equivalent)
+
+
+def widenedChildCount(node : Node) -> int:
+	"""
+	Number of children node may have under progressive widening.
+	
+	:param node: node whose ranked_actions have been set
+	:type node: Node
+	:rtype: int
+	"""
+	return min(len(node.ranked_actions), math.ceil(PW_C * (node.N + 1) ** PW_ALPHA))
+
+
+def actionPrior(rank : int, num_actions : int) -> float:
+	"""
+	Prior probability of the action ranked rank-th (from 0) out of num_actions by player.rankActions.
+	
+	:param rank: position of the action in the ranking
+	:type rank: int
+	:param num_actions: number of legal actions
+	:type num_actions: int
+	:rtype: float
+	"""
+	return PRIOR_DECAY ** rank * (1 - PRIOR_DECAY) / (1 - PRIOR_DECAY ** num_actions)
 
 
-def backprop(leaf: Node, loser : int):
+def treeDepth(node: Node) -> int:
 	"""
-	Backpropagates the win all the way up the Monte Carlo search tree.
+	Returns the number of edges on the longest branch below node.
+	
+	:param node: root of the (sub)tree to measure
+	:type node: Node
+	:rtype: int
+	"""
+	depth = 0
+	stack = [(node, 0)]
+	while len(stack) > 0:
+		n, d = stack.pop()
+		depth = max(depth, d)
+		stack += [(c, d + 1) for c in n.children]
+	return depth
+
+
+def releaseTree(root : Node):
+	"""
+	Frees a search tree that is no longer needed. The parent/child links are cut, so reference counting frees nodes built directly
+	at once instead of leaving the cycles to the garbage collector, and every node handed out by a NodePool goes back to that pool.
+	
+	:param root: root of the tree (or subtree, which is detached from its parent) to free
+	:type root: Node
+	"""
+	if root.parent is not None:
+		root.parent.children.remove(root)
+	stack = [root]
+	while len(stack) > 0:
+		n = stack.pop()
+		stack += n.children
+		n.children = []
+		n.parent = None # marks the node as released
+		if n.pool is not None:
+			n.pool.recycle(n)
+
+
+def rewardVector(num_seats : int, loser : int, reward : float = 1.0) -> list[float]:
+	"""
+	Reward of every player for a simulation that ended with loser as the durak.
+	
+	:param num_seats: length of the vector, the root state's numSeats()
+	:type num_seats: int
+	:param loser: The loser resulting from playout.
+	:type loser: int
+	:param reward: The amount given to the winners and taken from the loser.
+	:type reward: float
+	:return: rewards indexed by player number
+	:rtype: list[float]
+	"""
+	rewards = [reward] * num_seats
+	rewards[loser] = -reward
+	return rewards
+
+
+def evaluatorRewards(num_seats : int, state : TransferDurak, value : float) -> list[float]:
+	"""
+	Expected reward of every player when the player to move in state is not the durak with probability value.
+	The remaining probability of losing is split evenly between the other players still in the game, players who are out have won.
+	
+	:param num_seats: length of the vector, the root state's numSeats()
+	:type num_seats: int
+	:param state: the scored (non-terminal) state
+	:type state: TransferDurak
+	:param value: the evaluator's probability that the player to move is not the durak
+	:type value: float
+	:return: expected rewards indexed by player number
+	:rtype: list[float]
+	"""
+	rewards = [1.0] * num_seats
+	others_lose = value / (len(state.player_numbers) - 1) # chance that one given opponent of the player to move is the durak
+	for number in state.player_numbers:
+		rewards[number] = 1 - 2 * others_lose
+	rewards[state.getCurrentPlayerNumber()] = 2 * value - 1
+	return rewards
+
+
+def backprop(leaf: Node, rewards : list[float]):
+	"""
+	Backpropagates the result of a simulation all the way up the Monte Carlo search tree.
+	Every node is credited with the reward of the player who took its action, so each player maximizes their own reward (max^n).
 	
 	:param leaf: The leaf node we simulated the win from.
 	:type leaf: Node
-	:param loser: The loser resulting from playout.
-	:type losert: int
-	"""
-	if loser == leaf.player: # penalize losses
-		leaf.U -= 1
-	if loser != leaf.player : # reward wins
-		leaf.U += 1
-	leaf.N += 1 # add to total visits
-	if leaf.parent is not None: # recusrively update along branch of tree until reaching the root
-		backprop(leaf.parent, loser)
+	:param rewards: reward of every player, indexed by player number (see rewardVector and evaluatorRewards).
+	:type rewards: list[float]
+	"""
+	node = leaf
+	while node.parent is not None: # update along branch of tree until reaching the root
+		node.U += rewards[node.player]
+		node.N += 1 # add to total visits
+		node = node.parent
+	node.N += 1 # the root's value is never read (and the player who moved into it may have left the game), only its visits
+
+
+def backpropAMAF(leaf: Node, rewards : list[float], trace : list[tuple]):
+	"""
+	Updates the all-moves-as-first statistics along the branch from leaf to the root.
+	Every sibling on the branch whose (player, action) pair was played later in the simulation (further down the branch or in the playout) is credited with the result.
+	
+	:param leaf: The leaf node we simulated the win from.
+	:type leaf: Node
+	:param rewards: reward of every player, indexed by player number.
+	:type rewards: list[float]
+	:param trace: The (player, action) pairs played during the playout.
+	:type trace: list[tuple]
+	"""
+	played = set(trace)
+	node = leaf
+	while node is not None:
+		for c in node.children:
+			if (c.player, c.action) in played:
+				c.N_amaf += 1
+				c.U_amaf += rewards[c.player]
+		played.add((node.player, node.action))
+		node = node.parent
 		
 
-def updateSearchTree(root: Node, s: TransferDurak):
+def expandNode(root: Node, s: TransferDurak, rave_k = None, widening : bool = False, pool : NodePool = None, prune : bool = True,
+			   prune_equivalent : bool = False) -> tuple[Node, TransferDurak]:
 	"""
-	Performs one update step of Monte Carlo tree search.
+	Selects a node of the search tree and adds one of its unvisited children to the tree.
 	
 	:param root: The root of the Monte Carlo search tree.
 	:type root: Node
 	:param s: The state corresponding to the root of the Monte Carlo Search tree.
-	:type s: State
+	:type s: TransferDurak
+	:param rave_k: RAVE equivalence parameter used during selection, or None for plain UCB1.
+	:param widening: If True, children are added in player.rankActions order as progressive widening allows, instead of in random order.
+	:param pool: NodePool bounding the size of the tree, or None for an unbounded tree.
+	:param prune: If False, a full pool pauses expansion instead of pruning. Used while leaves expanded earlier are waiting for backprop,
+	              since their N is still 0 and pruning would release them first.
+	:param prune_equivalent: If True, the tree only holds one action per class of actions that differ by equivalent cards (Player.pruneEquivalentActions).
+	:return: The new leaf (or the selected node if it is terminal or the pool is full) and a copy of the state corresponding to it.
+	:rtype: tuple[Node, TransferDurak]
 	"""
+	stats = currentStats() # read once, so the step is profiled consistently even if another thread starts profiling
+	# make room for the new child before selecting, so the selected branch cannot be pruned
+	paused = pool is not None and pool.isFull() and not (prune and pool.prune(root))
+
 	# select node
-	node, state = selectNode(root, TransferDurak(s))
+	if stats is None:
+		node, state = selectNode(root, TransferDurak(s), rave_k, widening, prune_equivalent)
+	else:
+		state = stats.call('clone', TransferDurak, s)
+		node, state = stats.call('selection', selectNode, root, state, rave_k, widening, prune_equivalent)
+		expansion_start = time.perf_counter()
+
+	# if nothing could be pruned, pause expansion and play out from the selected node
+	if paused:
+		return node, state
 
 	# generate a new child (or skip if we selected a terminal node)
 	if not state.isTerminal():
-		visited_actions = {c.action for c in node.children}
-		unvisited_actions = [a for a in state.actions() if a not in visited_actions]
-		a = random.choice(unvisited_actions)
+		if widening: # children are added in ranked order (skipping any that are already in the tree)
+			visited_actions = {c.action for c in node.children}
+			rank = next(i for i, a in enumerate(node.ranked_actions) if a not in visited_actions)
+			a = node.ranked_actions[rank]
+			prior = actionPrior(rank, len(node.ranked_actions))
+		else:
+			visited_actions = {c.action for c in node.children}
+			possible_actions = state.actions(prune_equivalent) if stats is None else stats.call('actions', state.actions, prune_equivalent)
+			unvisited_actions = [a for a in possible_actions if a not in visited_actions]
+			a = random.choice(unvisited_actions)
+			prior = 1.0
 		state.transition(a) # update state to correspond to generated child
-		leaf = Node(action = a, parent = node, player = state.last_player) # generate child node and add to tree ## FIX TO GET PROPER INDEX OF PLAYER
+		if pool is not None:
+			leaf = pool.newNode(action = a, parent = node, player = state.last_player)
+		else:
+			leaf = Node(action = a, parent = node, player = state.last_player) # generate child node and add to tree ## FIX TO GET PROPER INDEX OF PLAYER
+		leaf.P = prior
 		node.children.append(leaf) # add child to its parent's list of children
 	else:
 		leaf = node
+	if stats is not None:
+		stats.times['expansion'] += time.perf_counter() - expansion_start
+		stats.calls['expansion'] += 1
+	return leaf, state
+
+
+def updateSearchTree(root: Node, s: TransferDurak, playout_depth = None, playout_policy = None, rave_k = None, widening : bool = False, pool : NodePool = None,
+					 prune_equivalent : bool = False):
+	"""
+	Performs one update step of Monte Carlo tree search.
+	
+	:param root: The root of the Monte Carlo search tree.
+	:type root: Node
+	:param s: The state corresponding to the root of the Monte Carlo Search tree.
+	:type s: State
+	:param playout_depth: maximum number of plies per playout, or None for full-length playouts.
+	:param playout_policy: learned playout policy, or None to use player.chooseActionHeuristic.
+	:param rave_k: RAVE equivalence parameter, or None to disable the all-moves-as-first statistics.
+	:param widening: If True, use progressive widening with PUCT selection.
+	:param pool: NodePool bounding the size of the tree, or None for an unbounded tree.
+	:param prune_equivalent: If True, collapse tree actions that only differ by equivalent cards.
+	"""
+	stats = currentStats()
+	leaf, state = expandNode(root, s, rave_k, widening, pool, prune_equivalent = prune_equivalent)
 	
 	# determine winner through random play
-	winner = simulatePlayout(state)
+	trace = [] if rave_k is not None else None
+	if stats is None:
+		winner = simulatePlayout(state, max_depth = playout_depth, policy = playout_policy, trace = trace)
+	else:
+		winner = stats.call('playout', simulatePlayout, state, playout_depth, playout_policy, trace)
 
 	# update search tree
-	backprop(leaf, winner)
+	rewards = rewardVector(s.numSeats(), winner)
+	if stats is None:
+		backprop(leaf, rewards)
+	else:
+		stats.call('backprop', backprop, leaf, rewards)
+	if rave_k is not None:
+		backpropAMAF(leaf, rewards, trace)
 
 	# remove reference to the state
 	del state
-	
 
-def randomPlayout(s : TransferDurak) -> int:
+
+def updateSearchTreeEvaluator(root: Node, s: TransferDurak, evaluator, batch_size : int = 1, widening : bool = False, pool : NodePool = None,
+							  prune_equivalent : bool = False, cache = None):
 	"""
-	Samples a game from the belief state, then performs a random playout of the game.
+	Performs batch_size update steps of Monte Carlo tree search, scoring the new leaves with evaluator instead of playouts.
+	All leaves are expanded before any of them are scored, so the evaluator can score them in a single batch.
+	
+	:param root: The root of the Monte Carlo search tree.
+	:type root: Node
+	:param s: The state corresponding to the root of the Monte Carlo Search tree.
+	:type s: TransferDurak
+	:param evaluator: Object with an evaluate(states) method returning, for each state, the probability that the player to move is not the durak (e.g. valuenet.ValueNetwork).
+	:param batch_size: number of leaves to expand and score together.
+	:type batch_size: int
+	:param widening: If True, use progressive widening with PUCT selection.
+	:param pool: NodePool bounding the size of the tree, or None for an unbounded tree.
+	:param prune_equivalent: If True, collapse tree actions that only differ by equivalent cards.
+	:param cache: canonical.PositionCache of evaluator values, or None. Only leaves it has no value for (under any suit relabelling) are passed to the evaluator.
+	"""
+	# only prune the pool before the batch is pending
+	leaves = [expandNode(root, s, widening = widening, pool = pool, prune = i == 0, prune_equivalent = prune_equivalent) for i in range(batch_size)]
+
+	# terminal leaves have an exact result, the rest are scored by the evaluator
+	pending = [(leaf, state) for leaf, state in leaves if not state.isTerminal()]
+	for leaf, state in leaves:
+		if state.isTerminal():
+			backprop(leaf, rewardVector(s.numSeats(), state.player_numbers[0]))
+	if len(pending) == 0:
+		return
+	
+	states = [state for leaf, state in pending]
+	values = [None] * len(states)
+	if cache is not None:
+		keys = [canonicalKey(state) for state in states]
+		values = [cache.getValue(state, key) for state, key in zip(states, keys)]
+	missing = [i for i, value in enumerate(values) if value is None]
+	if len(missing) > 0:
+		stats = currentStats()
+		batch = [states[i] for i in missing]
+		scores = evaluator.evaluate(batch) if stats is None else stats.call('evaluator', evaluator.evaluate, batch)
+		for i, value in zip(missing, scores):
+			values[i] = value
+			if cache is not None:
+				cache.putValue(states[i], value, keys[i])
+	for (leaf, state), value in zip(pending, values):
+		backprop(leaf, evaluatorRewards(s.numSeats(), state, value))
+
+
+def playout(s : TransferDurak, agent, max_depth = None, trace = None) -> int:
+	"""
+	Samples a game from the belief state, then plays it out with durak.runGame, every player using agent.
+	Shared by all playout functions.
 	
 	:param s: game state.
 	:type s: TransferDurak
+	:param agent: function taking the sampled game and returning the action of its current player.
+	:param max_depth: number of plies to play before scoring the position with staticEvaluation, or None to play to the end of the game
+	                  (at most MAX_PLAYOUT_PLIES plies either way).
+	:param trace: list to append the (player, action) pairs of the playout to, or None to not record them.
 	:return: The number of the durak
 	:rtype: int
 	"""
-	state = s.sampleBelief() # get a sample of the game from the belief state
-	while not state.isTerminal():
-		player = state.getCurrentPlayer()
-		player_idx = state.attacker_pos if state.is_attacker_move else state.defender_pos
-		
-		a = random.choice(player.actions())
-		state.last_move_str = state.getMoveString(a, player_idx)
-		state.last_player = state.getCurrentPlayerNumber()
-		state.last_move = a
-
-		last_round = state.round
-		state.transition(a)
-
-		if state.round > last_round:
-			state.restockHands() # Only restock at the end of a round
-
+	stats = currentStats()
+	state = s.sampleBelief() if stats is None else stats.call('sampleBelief', s.sampleBelief) # get a sample of the game from the belief state
+	if stats is not None:
+		restock = state.restockHands
+		state.restockHands = lambda: stats.call('restockHands', restock) # time restocking as its own phase (state is a private sample)
+	max_plies = MAX_PLAYOUT_PLIES if max_depth is None else min(max_depth, MAX_PLAYOUT_PLIES)
+	depth = runGame(state, agent, max_plies = max_plies, trace = trace)
+
+	if stats is not None:
+		stats.playout_steps += depth
+	if not state.isTerminal():
+		return sampleDurak(state) # the playout was truncated (or cut off in a cycle), let the evaluator pick the durak
 	return state.player_numbers[0] # this is the index of the durak
 
 
-def heuristicPlayout(s: TransferDurak) -> int:
+def randomPlayout(s : TransferDurak, max_depth = None, trace = None) -> int:
 	"""
-	Samples a game from the belief state, then performs a playout of the game according to player.chooseActionHeuristic
+	Samples a game from the belief state, then performs a random playout of the game.
 	
 	:param s: game state.
 	:type s: TransferDurak
+	:param max_depth: number of plies to play before scoring the position with staticEvaluation, or None to play to the end of the game.
+	:param trace: list to append the (player, action) pairs of the playout to, or None to not record them.
 	:return: The number of the durak
 	:rtype: int
 	"""
-	state = s.sampleBelief() # get a sample of the game from the belief state
-	while not state.isTerminal():
-		player = state.getCurrentPlayer()
-		player_idx = state.attacker_pos if state.is_attacker_move else state.defender_pos
-		
-		a = player.chooseActionHeuristic()
-		state.last_move_str = state.getMoveString(a, player_idx)
-		state.last_player = state.getCurrentPlayerNumber()
-		state.last_move = a
+	return playout(s, lambda state: random.choice(state.actions()), max_depth, trace)
 
-		last_round = state.round
-		state.transition(a)
 
-		if state.round > last_round:
-			state.restockHands() # Only restock at the end of a round
-
-	return state.player_numbers[0] # this is the index of the durak
+def heuristicPlayout(s: TransferDurak, max_depth = None, trace = None) -> int:
+	"""
+	Samples a game from the belief state, then performs a playout of the game according to player.chooseActionHeuristic
+	
+	:param s: game state.
+	:type s: TransferDurak
+	:param max_depth: number of plies to play before scoring the position with staticEvaluation, or None to play to the end of the game.
+	:param trace: list to append the (player, action) pairs of the playout to, or None to not record them.
+	:return: The number of the durak
+	:rtype: int
+	"""
+	return playout(s, lambda state: state.getCurrentPlayer().chooseActionHeuristic(), max_depth, trace)
 
 
-def epsilonLowestActionPlayout(s: TransferDurak, eps: float = 0.1) -> int:
+def epsilonLowestActionPlayout(s: TransferDurak, eps: float = 0.1, max_depth = None, trace = None) -> int:
 	"""
 	Samples a game from the belief state, then performs a playout of the game according to player.chooseActionHeuristic with an epsilon probability of choosing a random action
 	
 	:param s: game state.
 	:type s: TransferDurak
+	:param max_depth: number of plies to play before scoring the position with staticEvaluation, or None to play to the end of the game.
+	:param trace: list to append the (player, action) pairs of the playout to, or None to not record them.
 	:return: The number of the durak
 	:rtype: int
 	"""
-	state = s.sampleBelief() # get a sample of the game from the belief state
-	while not state.isTerminal():
-		player = state.getCurrentPlayer()
-		player_idx = state.attacker_pos if state.is_attacker_move else state.defender_pos
-
-		# choose a random action with probability epsilon
-		if random.random() < eps:
-			a = random.choice(player.actions())
-		else:
-			a = player.chooseActionHeuristic()
+	def agent(state):
+		if random.random() < eps: # choose a random action with probability epsilon
+			return random.choice(state.actions())
+		return state.getCurrentPlayer().chooseActionHeuristic()
+	return playout(s, agent, max_depth, trace)
 
-		state.last_move_str = state.getMoveString(a, player_idx)
-		state.last_player = state.getCurrentPlayerNumber()
-		state.last_move = a
 
-		last_round = state.round
-		state.transition(a)
+def staticEvaluation(state: TransferDurak) -> list[float]:
+	"""
+	Cheap static evaluation of a fully determined (sampled) game state.
+	Each player is rewarded for every card they hold in proportion to the fraction of live cards (cards that are not discarded
+	and not in that player's hand) it beats, with a bonus for trumps, and penalized for the number of cards left to shed.
+	
+	:param state: game state to evaluate. Should be a sample from sampleBelief, since hidden cards are read directly.
+	:type state: TransferDurak
+	:return: A score for each player in state.players. Higher scores are less likely to end up as the durak.
+	:rtype: list[float]
+	"""
+	config = state.config
+	beats = config.beats_masks[state.trump] # precomputed once per config, so counting the cards a card beats is one AND
+	live = ((1 << config.num_cards) - 1) & ~config.bits(state.discard)
+	scores = []
+	for player in state.players:
+		opponents = live & ~config.bits(player.hand) # cards that could still be played against this player
+		num_opponents = bin(opponents).count('1')
+		score = -EVAL_HAND_WEIGHT * len(player.hand)
+		for card in player.hand:
+			if num_opponents > 0:
+				beaten = bin(beats[config.cardId(card)] & opponents).count('1')
+				score += EVAL_CARD_WEIGHT * beaten / num_opponents
+			if state.isTrump(card):
+				score += EVAL_TRUMP_WEIGHT
+		scores.append(score)
+	return scores
+
+
+def sampleDurak(state: TransferDurak) -> int:
+	"""
+	Samples the durak of a truncated playout from a softmax over the negated static evaluation scores.
+	Sampling (rather than taking the lowest score) keeps the result of a truncated playout an unbiased estimate of the evaluator's win probability.
+	
+	:param state: game state to evaluate.
+	:type state: TransferDurak
+	:return: The number of the sampled durak
+	:rtype: int
+	"""
+	if state.isTerminal():
+		return state.player_numbers[0]
+	scores = staticEvaluation(state)
+	best = max(scores)
+	weights = [math.exp(EVAL_TEMPERATURE * (best - score)) for score in scores] # lower scores are more likely to be the durak
+	return random.choices(state.player_numbers, weights = weights)[0]
 
-		if state.round > last_round:
-			state.restockHands() # Only restock at the end of a round
 
-	return state.player_numbers[0] # this is the index of the durak
+def policyPlayout(s: TransferDurak, policy, max_depth = None, trace = None) -> int:
+	"""
+	Samples a game from the belief state, then performs a playout of the game according to a learned playout policy.
+	
+	:param s: game state.
+	:type s: TransferDurak
+	:param policy: Object with a chooseAction(player) method (e.g. policy.PlayoutPolicy).
+	:param max_depth: number of plies to play before scoring the position with staticEvaluation, or None to play to the end of the game.
+	:param trace: list to append the (player, action) pairs of the playout to, or None to not record them.
+	:return: The number of the durak
+	:rtype: int
+	"""
+	return playout(s, lambda state: policy.chooseAction(state.getCurrentPlayer()), max_depth, trace)
 
 
-def simulatePlayout(s: TransferDurak):
+def simulatePlayout(s: TransferDurak, max_depth = None, policy = None, trace = None):
 	"""
 	Method of playout used in MCTS to simulate games.
 	
 	:param s: Description
 	:type s: TransferDurak
+	:param max_depth: number of plies to play before truncating the playout, or None to play to the end of the game.
+	:param policy: learned playout policy (e.g. policy.PlayoutPolicy), or None to use the playout named by PLAYOUT.
+	:param trace: list to append the (player, action) pairs of the playout to, or None to not record them.
+	"""
+	if policy is not None:
+		return policyPlayout(s, policy, max_depth = max_depth, trace = trace)
+	if PLAYOUT == 'random':
+		return randomPlayout(s, max_depth = max_depth, trace = trace)
+	if PLAYOUT == 'epsilon':
+		return epsilonLowestActionPlayout(s, max_depth = max_depth, trace = trace)
+	return heuristicPlayout(s, max_depth = max_depth, trace = trace)
+
+
+class SearchSnapshot:
+	def __init__(self, best_action, visits : dict, iterations : int, elapsed : float, done : bool):
+		"""
+		Progress report yielded by anytimeMCTS.
+		
+		:param best_action: the most visited action at the root so far (None before the root has children)
+		:param visits: dictionary mapping each root action to its visit count
+		:param iterations: number of iterations performed so far
+		:param elapsed: seconds since the search started
+		:param done: True for the last snapshot of a search that used up its budget
+		"""
+		self.best_action = best_action
+		self.visits = visits
+		self.iterations = iterations
+		self.elapsed = elapsed
+		self.done = done
+
+	def iterationsPerSecond(self) -> float:
+		if self.elapsed == 0:
+			return 0.0
+		return self.iterations / self.elapsed
+
+
+def rootVisits(root: Node) -> tuple:
+	"""
+	Returns the most visited action at the root and a dictionary mapping each root action to its visit count.
+	
+	:param root: The root of the Monte Carlo search tree.
+	:type root: Node
+	:rtype: tuple
 	"""
-	return heuristicPlayout(s)
+	visits = {}
+	max_visits = -float('inf')
+	max_idx = None
+	for i,c in enumerate(root.children):
+		visits[c.action] = c.N
+		if c.N > max_visits:
+			max_idx = i
+			max_visits = c.N
+	if max_idx is None:
+		return None, visits
+	return root.children[max_idx].action, visits
 
 
-def MCTS(s: TransferDurak, num_iterations = None, time_limit = None):
+def searchStep(root: Node, s: TransferDurak, batch_size : int = 1, playout_depth = None, evaluator = None, playout_policy = None,
+			   rave_k = None, widening : bool = False, node_pool : NodePool = None, stats : SearchStats = None, prune_equivalent : bool = False,
+			   evaluator_cache = None) -> int:
+	"""
+	Performs one update of the search tree with the options of MCTS: a single playout, or a batch of leaves when an evaluator is given.
+	
+	:param stats: SearchStats to record the step in, or None to not profile it.
+	:return: The number of iterations performed.
+	:rtype: int
+	"""
+	profiling.stats = stats
+	try:
+		if evaluator is not None:
+			updateSearchTreeEvaluator(root, s, evaluator, batch_size, widening, node_pool, prune_equivalent, evaluator_cache)
+			return batch_size
+		updateSearchTree(root, s, playout_depth = playout_depth, playout_policy = playout_policy, rave_k = rave_k, widening = widening, pool = node_pool,
+						 prune_equivalent = prune_equivalent)
+		return 1
+	finally:
+		profiling.stats = None
+
+
+def anytimeMCTS(s: TransferDurak, num_iterations = None, time_limit = None, snapshot_iterations = None, snapshot_seconds = None,
+				root : Node = None, batch_size : int = 1, node_pool : NodePool = None, stats : SearchStats = None, **options):
+	"""
+	Generator running Monte Carlo tree search from state s and yielding a SearchSnapshot every snapshot_iterations iterations
+	and/or every snapshot_seconds seconds, then a final snapshot (with done set) once the budget is used up.
+	The caller may stop iterating at any point and play the best_action of the last snapshot.
+	
+	The clock is only read every TIME_CHECK_SECONDS worth of iterations (estimated from the running iteration rate),
+	so deadlines and timed snapshots may be late by about that much.
+	
+	:param s: The game state to search from.
+	:type s: TransferDurak
+	:param num_iterations: Maximum number of iterations, or None.
+	:param time_limit: Maximum time to search for, or None. If both budgets are None the search runs until the caller stops it.
+	:param snapshot_iterations: Yield a snapshot every this many iterations, or None.
+	:param snapshot_seconds: Yield a snapshot every this many seconds, or None.
+	:param root: Search tree of s grown by an earlier search to keep searching, or None to start a new tree.
+	:param batch_size: Number of leaves scored per call to the evaluator. Ignored when no evaluator is given.
+	:param node_pool: NodePool bounding the number of live nodes. A tree created here is released to it when the generator finishes or is closed.
+	:param stats: SearchStats to profile the search into, or None (the default) to not profile.
+	:param options: Remaining search options of MCTS (playout_depth, evaluator, playout_policy, rave_k, widening, prune_equivalent, evaluator_cache).
+	"""
+	if num_iterations is not None and time_limit is not None:
+		raise ValueError('one of num_iterations and time_limit must be None')
+	if options.get('evaluator') is not None: # evaluator searches score leaves without playouts, so there is nothing to truncate or trace
+		for option in ('rave_k', 'playout_depth', 'playout_policy'):
+			if options.get(option) is not None:
+				raise ValueError(f'{option} cannot be combined with an evaluator')
+	elif options.get('evaluator_cache') is not None:
+		raise ValueError('evaluator_cache needs an evaluator')
+
+	# root of the search tree
+	# each node's player is the player who sent the game to that state (the last person who played)
+	owns_root = root is None
+	if root is None:
+		if node_pool is not None:
+			root = node_pool.newNode(action = 'root' if s.last_move is None else s.last_move, parent = None, player = s.last_player)
+		else:
+			root = Node(action = 'root' if s.last_move is None else s.last_move, parent = None, player = s.last_player)
+
+	start = time.perf_counter()
+	deadline = None if time_limit is None else start + time_limit
+	next_snapshot_time = None if snapshot_seconds is None else start + snapshot_seconds
+	next_snapshot_iterations = snapshot_iterations
+	next_time_check = 1 # iteration count at which the clock is read next
+	iterations = 0
+	try:
+		while num_iterations is None or iterations < num_iterations:
+			size = batch_size if num_iterations is None else min(batch_size, num_iterations - iterations)
+			iterations += searchStep(root, s, size, node_pool = node_pool, stats = stats, **options)
+
+			# batched clock reads
+			if iterations >= next_time_check:
+				now = time.perf_counter()
+				rate = iterations / max(now - start, 1e-9)
+				next_time_check = iterations + max(1, int(rate * TIME_CHECK_SECONDS))
+				if deadline is not None and now >= deadline:
+					break
+				if next_snapshot_time is not None and now >= next_snapshot_time:
+					next_snapshot_time = now + snapshot_seconds
+					yield SearchSnapshot(*rootVisits(root), iterations, now - start, False)
+
+			if next_snapshot_iterations is not None and iterations >= next_snapshot_iterations and iterations != num_iterations: # the final snapshot follows
+				next_snapshot_iterations += snapshot_iterations
+				yield SearchSnapshot(*rootVisits(root), iterations, time.perf_counter() - start, False)
+
+		if stats is not None:
+			stats.iterations += iterations
+			stats.elapsed += time.perf_counter() - start
+			stats.recordTree(root)
+		yield SearchSnapshot(*rootVisits(root), iterations, time.perf_counter() - start, True)
+	finally:
+		# hand the nodes back to the pool so the next search reuses them
+		if node_pool is not None and owns_root:
+			node_pool.release(root)
+
+
+def MCTS(s: TransferDurak, num_iterations = None, time_limit = None, playout_depth = None, evaluator = None, batch_size : int = 1,
+		 playout_policy = None, return_visits : bool = False, rave_k = None, widening : bool = False, node_pool : NodePool = None, root : Node = None,
+		 profile : bool = False, prune_equivalent : bool = False, evaluator_cache = None):
 	"""
 	Performs Monte Carlo tree search from state s to determine the next move.
 	
@@ -217,6 +914,21 @@ def MCTS(s: TransferDurak, num_iterations = None, time_limit = None):
 	:type s: State
 	:param num_iterations: Maximum number of iterations to search for, or None if using time constraint.
 	:param time_limit: Maximum time to search for, or None if using iteration constraint.
+	:param playout_depth: Maximum number of plies per playout before the position is scored by staticEvaluation, or None for full-length playouts.
+	:param evaluator: Leaf evaluator used instead of playouts (e.g. valuenet.ValueNetwork), or None to use simulatePlayout.
+	                  Raises ValueError if combined with the playout options playout_depth, playout_policy or rave_k.
+	:param batch_size: Number of leaves scored per call to the evaluator. Ignored when evaluator is None.
+	:param playout_policy: Learned playout policy (e.g. policy.PlayoutPolicy.load()), or None to use player.chooseActionHeuristic.
+	:param return_visits: If True, also return a dictionary mapping each root action to its visit count.
+	:param rave_k: RAVE equivalence parameter blending all-moves-as-first values into selection (e.g. RAVE_K), or None for plain UCB1.
+	:param widening: If True, children are added in player.rankActions order as the visit count grows (progressive widening) and selected by PUCT with rank-based priors.
+	:param node_pool: NodePool bounding the number of live nodes (e.g. NodePool(100000)), or None for an unbounded tree. A new tree is released back to the pool when the search ends.
+	:param root: Search tree of s grown by an earlier search (e.g. ponder.Ponderer) to keep searching, or None to start a new tree.
+	:param profile: If True, time the phases of the search and also return the SearchStats (after the visits, if those are returned).
+	:param prune_equivalent: If True, the tree keeps one action per class of actions that only differ by equivalent cards (Player.pruneEquivalentActions).
+	                         Only this search is affected: other callers of actions() and the playouts still see every action.
+	:param evaluator_cache: canonical.PositionCache reusing evaluator values across leaves, moves and games that are the same position up to suit labelling,
+	                        or None. Only valid with an evaluator, and only exact for evaluators that do not depend on how the suits are labelled.
 	:return: The best action according to MCTS.
 	:rtype: int
 	"""
@@ -225,31 +937,39 @@ def MCTS(s: TransferDurak, num_iterations = None, time_limit = None):
 		raise ValueError('one of num_iterations or time_limit must not be None')
 	if num_iterations is not None and time_limit is not None:
 		raise ValueError('one of num_iterations and time_limit must be None')
-	
-	# root of the search tree
-	# each node's player is the player who sent the game to that state (the last person who played)
-	root = Node(action = 'root' if s.last_move is None else s.last_move, parent = None, player = s.last_player)
 
-	# iteration based constraint
-	if num_iterations is not None:
-		for i in range(num_iterations):
-			updateSearchTree(root, s)
+	# run the search to the end of its budget and keep the final snapshot
+	stats = SearchStats() if profile else None
+	for snapshot in anytimeMCTS(s, num_iterations = num_iterations, time_limit = time_limit, root = root, batch_size = batch_size, node_pool = node_pool, stats = stats,
+								playout_depth = playout_depth, evaluator = evaluator, playout_policy = playout_policy, rave_k = rave_k, widening = widening,
+								prune_equivalent = prune_equivalent, evaluator_cache = evaluator_cache):
+		pass
 
-	# time based constraint
-	if time_limit is not None:
-		start = time.time()
-		while time.time() - start < time_limit:
-			updateSearchTree(root, s)
-
-	# get the most visited child of the root
-	visits = {}
-	max_visits = -float('inf')
-	max_idx = None
-	for i,c in enumerate(root.children):
-		visits[c.action] = c.N
-		if c.N > max_visits:
-			max_idx = i
-			max_visits = c.N
-	return root.children[max_idx].action
+	result = (snapshot.best_action,)
+	if return_visits:
+		result += (snapshot.visits,)
+	if profile:
+		result += (stats,)
+	return result if len(result) > 1 else result[0]
 
 
+def hybridAction(game : TransferDurak, search, talon : int = ENDGAME_TALON) -> tuple:
+	"""
+	Chooses the move of the hybrid agent (main.py, tournament.HybridAgent): a forced move is played directly,
+	chooseActionHeuristic plays while the talon has more than talon cards, and search plays the endgame.
+	
+	:param game: game whose current player is to move
+	:type game: TransferDurak
+	:param search: function taking game and returning the action to play, e.g. lambda game: MCTS(game, num_iterations = 250)
+	:param talon: talon size at which search takes over
+	:type talon: int
+	:return: the chosen action
+	:rtype: tuple
+	"""
+	player = game.getCurrentPlayer()
+	actions = player.actions()
+	if len(actions) == 1: # if there is only one action, do not search
+		return actions[0]
+	if len(game.talon) > talon: # if we are NOT in the endgame, do not search
+		return player.chooseActionHeuristic()
+	return search(game)
@@ -0,0 +1,132 @@
+from tournament import Matchup
+from tournament import MCTSAgent
+from tournament import HybridAgent
+from tournament import HeuristicAgent
+from tournament import RandomAgent
+from tournament import runTournament
+from tournament import TOURNAMENT_SEED
+from results import ResultStore
+from results import RESULTS_DIR
+from tournament import wilsonInterval
+import argparse
+import hashlib
+import search
+import pickle
+import durak
+import json
+
+###################################################################
+#                       Global Constants                          #
+###################################################################
+
+SWEEP_ITERATIONS : list[int] = [10, 100, 200, 500, 700, 1000] # playout budgets of the README experiments
+SWEEP_GAMES : int = 100 # games per matchup of the README experiments
+
+###################################################################
+#                         Resumable Sweeps                        #
+###################################################################
+
+def optionDigest(o) -> dict:
+    """
+    JSON stand-in for an object in an agent configuration (an evaluator or playout policy): its type and a hash of its pickled contents,
+    so that two objects with different weights never share a cell.
+    """
+    return {'type': type(o).__name__, 'sha256': hashlib.sha256(pickle.dumps(o)).hexdigest()}
+
+
+def cellKey(matchup : Matchup, seed : int = TOURNAMENT_SEED) -> str:
+    """
+    Content hash of everything that determines the games of a matchup: both agents' configurations (objects among their options by
+    optionDigest), the number of players, the seed of game 0, and the module settings agents read during play
+    (search.UCB_C, search.PLAYOUT, durak.TALON_TOLERANCE and durak.EPSILON).
+    Two matchups with the same key play identical games, so their results can be shared.
+
+    :param matchup: matchup to key
+    :type matchup: Matchup
+    :param seed: seed of the first game
+    :type seed: int
+    :rtype: str
+    """
+    content = {'agent': matchup.agent.config(), 'opponent': matchup.opponent.config(), 'num_players': matchup.num_players, 'seed': seed,
+               'settings': {'UCB_C': search.UCB_C, 'PLAYOUT': search.PLAYOUT, 'TALON_TOLERANCE': durak.TALON_TOLERANCE, 'EPSILON': durak.EPSILON}}
+    encoded = json.dumps(content, sort_keys = True, default = optionDigest)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16]
+
+
+def runSweep(matchups : list[Matchup], store : ResultStore, seed : int = TOURNAMENT_SEED, num_workers : int = None, run : str = None,
+             verbose : bool = True) -> list[dict]:
+    """
+    Plays the games of matchups that store does not have yet, recording each game as soon as it finishes.
+    An interrupted sweep resumes where it stopped, finished matchups are skipped, and raising num_games tops a matchup up.
+
+    :param matchups: matchups of the sweep
+    :type matchups: list[Matchup]
+    :param store: where results are looked up and recorded
+    :type store: ResultStore
+    :param seed: game i of every matchup is dealt with seed + i
+    :param num_workers: number of worker processes, or None for one per core
+    :param run: label recorded with the new games
+    :param verbose: print what is played and the results
+    :return: store.summary of each matchup's cell (every recorded game of that configuration), with 0 games if it has none
+    :rtype: list[dict]
+    """
+    keys = [cellKey(matchup, seed) for matchup in matchups]
+    tasks = []
+    for m, (matchup, key) in enumerate(zip(matchups, keys)):
+        done = store.completedGames(key)
+        missing = [i for i in range(matchup.num_games) if i not in done]
+        tasks += [(m, matchup, i, seed + i) for i in missing]
+        if verbose:
+            print(f'{matchup.name} [{key}]: {matchup.num_games - len(missing)}/{matchup.num_games} games recorded, playing {len(missing)}')
+
+    for result in runTournament(matchups, seed, num_workers, tasks):
+        store.record(matchups[result.matchup], result, run, keys[result.matchup]) # checkpoint every game
+
+    summaries = [cellSummary(store, key) for key in keys]
+    if verbose:
+        for matchup, s in zip(matchups, summaries):
+            print(f'{matchup.name}: win rate {s["win_rate"]:.3f} [{s["win_rate_low"]:.3f}, {s["win_rate_high"]:.3f}] over {s["games"]} games')
+    return summaries
+
+
+def cellSummary(store : ResultStore, key : str) -> dict:
+    """
+    :return: store.summary of the games of cell key. A cell without decided games (no games asked for, or only draws) gets a summary with 0 games.
+    :rtype: dict
+    """
+    summaries = store.summary(group_by = (), cell = key)
+    if len(summaries) > 0:
+        return summaries[0]
+    low, high = wilsonInterval(0, 0)
+    draws = len(store.completedGames(key))
+    return {'games': 0, 'draws': draws, 'win_rate': 0.0, 'win_rate_low': low, 'win_rate_high': high, 'mean_plies': None, 'mean_seconds': None,
+            'iterations_per_second': None}
+
+
+def readmeMatchups(iterations : list[int] = SWEEP_ITERATIONS, num_games : int = SWEEP_GAMES, num_players : int = 2) -> list[Matchup]:
+    """
+    The matchups of the README results: pure MCTS against random and heuristic players, the hybrid against heuristic players
+    at every budget, and the random player against heuristic players.
+    """
+    matchups = []
+    for n in iterations:
+        matchups += [Matchup(MCTSAgent(n), RandomAgent(), num_players, num_games),
+                     Matchup(MCTSAgent(n), HeuristicAgent(), num_players, num_games),
+                     Matchup(HybridAgent(n), HeuristicAgent(), num_players, num_games)]
+    matchups.append(Matchup(RandomAgent(), HeuristicAgent(), num_players, num_games))
+    return matchups
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Runs the README experiments, resuming from the games already in the result store.')
+    parser.add_argument('--iterations', type = int, nargs = '+', default = SWEEP_ITERATIONS, help = 'playouts per move of the MCTS agents')
+    parser.add_argument('--games', type = int, default = SWEEP_GAMES, help = 'games per matchup')
+    parser.add_argument('--players', type = int, default = 2, help = 'players per game')
+    parser.add_argument('--workers', type = int, default = None, help = 'worker processes (default: one per core)')
+    parser.add_argument('--seed', type = int, default = TOURNAMENT_SEED, help = 'seed of the first game')
+    parser.add_argument('--store', default = RESULTS_DIR, help = 'directory of the result store')
+    parser.add_argument('--run', default = None, help = 'label recorded with the new games')
+    args = parser.parse_args()
+
+    with ResultStore(args.store) as store:
+        runSweep(readmeMatchups(args.iterations, args.games, args.players), store, args.seed, args.workers, args.run)
@@ -0,0 +1,413 @@
+from durak import TransferDurak
+from durak import runGame
+from search import MCTS
+from search import hybridAction
+from search import ENDGAME_TALON
+import multiprocessing
+import argparse
+import random
+import math
+import time
+import os
+
+###################################################################
+#                       Global Constants                          #
+###################################################################
+
+TOURNAMENT_SEED : int = 0 # game i of every matchup is dealt with seed TOURNAMENT_SEED + i
+CONFIDENCE_Z : float = 1.96 # z score of the reported confidence intervals (95%)
+SPRT_ALPHA : float = 0.05 # probability of accepting p1 when the win rate is p0
+SPRT_BETA : float = 0.05 # probability of accepting p0 when the win rate is p1
+MAX_GAME_PLIES : int = 2000 # games still running after this many actions are recorded as draws (3+ player endgames can cycle)
+
+###################################################################
+#                             Agents                              #
+###################################################################
+
+# Agents are small picklable objects so that they can be sent to worker processes.
+# chooseAction(game) returns the action of the current player of game.
+
+class RandomAgent:
+    name = 'random'
+
+    def config(self) -> dict:
+        return {'type': 'RandomAgent'}
+
+    def chooseAction(self, game : TransferDurak) -> tuple:
+        return random.choice(game.actions())
+
+
+class HeuristicAgent:
+    name = 'heuristic'
+
+    def config(self) -> dict:
+        return {'type': 'HeuristicAgent'}
+
+    def chooseAction(self, game : TransferDurak) -> tuple:
+        player = game.getCurrentPlayer()
+        a, _, _ = player.lowestValueAction(player.actions())
+        return a
+
+
+class MCTSAgent:
+    def __init__(self, num_iterations : int, **options):
+        """
+        Pure MCTS agent.
+
+        :param num_iterations: number of playouts MCTS does per move
+        :param options: further keyword arguments for search.MCTS (playout_depth, rave_k, ...)
+        """
+        self.num_iterations = num_iterations
+        self.options = options
+        self.name = f'MCTS{num_iterations}' + ''.join(f' {k}={v}' for k, v in options.items())
+        self.iterations = 0 # search iterations run so far
+        self.search_seconds = 0.0 # time spent searching so far
+
+
+    def config(self) -> dict:
+        """
+        :return: everything that determines how the agent plays (used to key sweep results). Objects passed as options
+                 (evaluators, playout policies) are keyed by a hash of their contents (sweep.optionDigest).
+        :rtype: dict
+        """
+        return {'type': type(self).__name__, 'num_iterations': self.num_iterations, 'options': self.options}
+
+
+    def chooseAction(self, game : TransferDurak) -> tuple:
+        start = time.perf_counter()
+        a = MCTS(game, num_iterations = self.num_iterations, **self.options)
+        self.search_seconds += time.perf_counter() - start
+        self.iterations += self.num_iterations
+        return a
+
+
+class HybridAgent(MCTSAgent):
+    def __init__(self, num_iterations : int, talon : int = ENDGAME_TALON, **options):
+        """
+        The agent of main.py: plays chooseActionHeuristic until the talon has at most talon cards, then MCTS.
+
+        :param num_iterations: number of playouts MCTS does per move
+        :param talon: talon size at which MCTS takes over
+        :param options: further keyword arguments for search.MCTS
+        """
+        super().__init__(num_iterations, **options)
+        self.talon = talon
+        self.name = 'hybrid' + self.name[len('MCTS'):] + ('' if talon == ENDGAME_TALON else f' talon={talon}')
+
+
+    def config(self) -> dict:
+        return {**super().config(), 'talon': self.talon}
+
+
+    def chooseAction(self, game : TransferDurak) -> tuple:
+        return hybridAction(game, super().chooseAction, self.talon)
+
+###################################################################
+#                           Tournament                            #
+###################################################################
+
+class Matchup:
+    def __init__(self, agent, opponent, num_players : int = 2, num_games : int = 100):
+        """
+        One agent against num_players - 1 copies of an opponent.
+        The agent sits in seat num_players - 1 of the lineup (the convention of test.py), and the lineup is rotated every game.
+
+        :param agent: agent being tested
+        :param opponent: agent filling the other seats
+        :param num_players: number of players per game
+        :param num_games: number of games to play
+        """
+        self.agent = agent
+        self.opponent = opponent
+        self.num_players = num_players
+        self.num_games = num_games
+        self.name = f'{agent.name} vs {num_players - 1} {opponent.name}'
+
+
+    def lineup(self) -> list:
+        return [self.opponent] * (self.num_players - 1) + [self.agent]
+
+
+class GameResult:
+    def __init__(self, matchup : int, game : int, seed : int, rotation : int, durak_seat : int, plies : int, seconds : float,
+                 iterations : int = 0, search_seconds : float = 0.0):
+        """
+        Outcome of one tournament game.
+
+        :param matchup: index of the matchup in the tournament
+        :param game: index of the game within the matchup
+        :param seed: seed the game was dealt with
+        :param rotation: the lineup was rotated right by this many seats, so lineup index k sat in seat (k + rotation) % num_players
+        :param durak_seat: player number of the durak, or None if the game was cut off after MAX_GAME_PLIES actions (a draw)
+        :param plies: number of actions played
+        :param seconds: wall time of the game
+        :param iterations: search iterations run by all agents during the game
+        :param search_seconds: time all agents spent searching
+        """
+        self.matchup = matchup
+        self.game = game
+        self.seed = seed
+        self.rotation = rotation
+        self.durak_seat = durak_seat
+        self.plies = plies
+        self.seconds = seconds
+        self.iterations = iterations
+        self.search_seconds = search_seconds
+
+
+    def durakIndex(self, num_players : int) -> int:
+        """
+        :return: index in the matchup lineup of the durak, so num_players - 1 if the tested agent lost, or None for a draw
+        :rtype: int
+        """
+        if self.durak_seat is None:
+            return None
+        return (self.durak_seat - self.rotation) % num_players
+
+
+def playGame(agents : list, seed : int, max_plies : int = MAX_GAME_PLIES) -> tuple[int, int]:
+    """
+    Plays one game between agents, agents[i] playing as player i.
+
+    :param agents: one agent per seat
+    :param seed: seed for dealing the game and for the agents' random choices
+    :param max_plies: number of actions after which the game is abandoned as a draw
+    :return: the player number of the durak (None for a draw), and the number of actions played
+    :rtype: tuple[int, int]
+    """
+    random.seed(seed)
+    game = TransferDurak(num_players = len(agents), num_humans = 0)
+    plies = runGame(game, [agent.chooseAction for agent in agents], max_plies = max_plies)
+    if not game.isTerminal():
+        return None, plies
+    return game.player_numbers[0], plies
+
+
+def playTask(task : tuple) -> GameResult:
+    """
+    Worker process entry point: plays one game of a matchup.
+
+    :param task: (matchup index, matchup, game index, seed)
+    :rtype: GameResult
+    """
+    index, matchup, game, seed = task
+    lineup = matchup.lineup()
+    rotation = game % matchup.num_players # alternate seats so that no agent always moves first
+    seats = [lineup[(i - rotation) % matchup.num_players] for i in range(matchup.num_players)]
+    agents = list({id(agent): agent for agent in lineup}.values()) # the opponent fills several seats but is one object
+    iterations = sum(getattr(agent, 'iterations', 0) for agent in agents)
+    search_seconds = sum(getattr(agent, 'search_seconds', 0.0) for agent in agents)
+    start = time.perf_counter()
+    durak, plies = playGame(seats, seed)
+    seconds = time.perf_counter() - start
+    iterations = sum(getattr(agent, 'iterations', 0) for agent in agents) - iterations
+    search_seconds = sum(getattr(agent, 'search_seconds', 0.0) for agent in agents) - search_seconds
+    return GameResult(index, game, seed, rotation, durak, plies, seconds, iterations, search_seconds)
+
+
+def runTournament(matchups : list[Matchup], seed : int = TOURNAMENT_SEED, num_workers : int = None, tasks : list[tuple] = None):
+    """
+    Plays every game of every matchup on a process pool, yielding results in the order they finish.
+    Game i of every matchup is dealt with seed + i, so matchups are compared on the same deals and a rerun gives the same results.
+
+    :param matchups: matchups to play
+    :type matchups: list[Matchup]
+    :param seed: seed of the first game
+    :type seed: int
+    :param num_workers: number of worker processes, or None for one per core. 1 plays the games in this process.
+    :param tasks: (matchup index, matchup, game index, seed) tuples to play, or None to play every game
+    :return: generator of GameResult
+    """
+    if tasks is None:
+        tasks = [(m, matchup, i, seed + i) for m, matchup in enumerate(matchups) for i in range(matchup.num_games)]
+    if num_workers is None:
+        num_workers = os.cpu_count()
+    if num_workers == 1:
+        for task in tasks:
+            yield playTask(task)
+        return
+    with multiprocessing.Pool(num_workers) as pool:
+        for result in pool.imap_unordered(playTask, tasks):
+            yield result
+
+
+###################################################################
+#                       Sequential Testing                        #
+###################################################################
+
+def wilsonInterval(wins : int, games : int, z : float = CONFIDENCE_Z) -> tuple[float, float]:
+    """
+    Wilson score confidence interval for a win rate. Unlike the normal approximation, it stays inside [0, 1] for lopsided matchups.
+
+    :param wins: number of games won
+    :param games: number of games played
+    :param z: z score of the confidence level
+    :return: lower and upper bound of the win rate
+    :rtype: tuple[float, float]
+    """
+    if games == 0:
+        return 0.0, 1.0
+    p = wins / games
+    center = (p + z * z / (2 * games)) / (1 + z * z / games)
+    half_width = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+class SPRT:
+    def __init__(self, p0 : float = 0.5, p1 : float = 0.6, alpha : float = SPRT_ALPHA, beta : float = SPRT_BETA):
+        """
+        Wald's sequential probability ratio test of win rate p0 against win rate p1 (p0 < p1).
+        Stops as soon as one hypothesis is accepted with the given error rates.
+
+        :param p0: win rate of the null hypothesis (the agent is no better than p0)
+        :param p1: win rate of the alternative hypothesis (the agent is at least p1)
+        :param alpha: probability of accepting p1 when the win rate is p0
+        :param beta: probability of accepting p0 when the win rate is p1
+        """
+        self.p0 = p0
+        self.p1 = p1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.llr = 0.0 # log likelihood ratio of p1 over p0
+        self.result = None # 'p0' or 'p1' once accepted
+
+
+    def update(self, won : bool):
+        if won:
+            self.llr += math.log(self.p1 / self.p0)
+        else:
+            self.llr += math.log((1 - self.p1) / (1 - self.p0))
+        if self.llr >= self.upper:
+            self.result = 'p1'
+        elif self.llr <= self.lower:
+            self.result = 'p0'
+
+
+    def done(self) -> bool:
+        return self.result is not None
+
+
+    def describe(self) -> str:
+        if self.result is None:
+            return f'SPRT inconclusive (llr {self.llr:.2f} in ({self.lower:.2f}, {self.upper:.2f}))'
+        return f'SPRT accepted win rate >= {self.p1}' if self.result == 'p1' else f'SPRT accepted win rate <= {self.p0}'
+
+
+class IntervalStop:
+    def __init__(self, width : float = 0.1, threshold : float = 0.5, z : float = CONFIDENCE_Z, min_games : int = 10):
+        """
+        Stops once the confidence interval of the win rate is narrower than width or no longer contains threshold.
+        Repeatedly checking an interval inflates its error rate, so use a larger z than for a single fixed-length run.
+
+        :param width: stop once the interval is at most this wide
+        :param threshold: stop once the interval lies entirely above or below this win rate
+        :param z: z score of the interval
+        :param min_games: never stop before this many games
+        """
+        self.width = width
+        self.threshold = threshold
+        self.z = z
+        self.min_games = min_games
+        self.wins = 0
+        self.games = 0
+
+
+    def update(self, won : bool):
+        self.wins += won
+        self.games += 1
+
+
+    def done(self) -> bool:
+        if self.games < self.min_games:
+            return False
+        low, high = wilsonInterval(self.wins, self.games, self.z)
+        return high - low <= self.width or low > self.threshold or high < self.threshold
+
+
+    def describe(self) -> str:
+        low, high = wilsonInterval(self.wins, self.games, self.z)
+        if low > self.threshold or high < self.threshold:
+            return f'interval excludes {self.threshold}'
+        return f'interval width {high - low:.3f}'
+
+
+def matchupDuraks(matchup : Matchup, seed : int = TOURNAMENT_SEED, num_workers : int = None, verbose : bool = True, stopping = None,
+                  store = None) -> list[int]:
+    """
+    Plays a single matchup and returns the durak of each game as an index in the lineup, in game order
+    (the format of the test.py trial files: num_players - 1 means the tested agent lost). Draws (games cut off after
+    MAX_GAME_PLIES actions) have no durak and are left out.
+
+    :param matchup: matchup to play. With a stopping rule, num_games is the maximum number of games.
+    :type matchup: Matchup
+    :param seed: seed of the first game
+    :param num_workers: number of worker processes, or None for one per core
+    :param verbose: print progress every 10% of the games, and the win rate with its confidence interval at the end
+    :param stopping: SPRT, IntervalStop, or None to play every game. Results are fed to it in game order,
+                     so that games which happen to finish quickly cannot bias the decision.
+    :param store: results.ResultStore every game is recorded in as soon as it finishes, or None
+    :rtype: list[int]
+    """
+    if verbose:
+        print(f'{matchup.name}, trials: {matchup.num_games}...')
+    loser = matchup.num_players - 1
+    duraks = [None] * matchup.num_games
+    done = [False] * matchup.num_games
+    played = 0 # games fed to the stopping rule, always a prefix of the matchup
+    finished = 0
+    for result in runTournament([matchup], seed, num_workers):
+        duraks[result.game] = result.durakIndex(matchup.num_players)
+        done[result.game] = True
+        finished += 1
+        if store is not None:
+            store.record(matchup, result)
+        if verbose and (10 * finished) // matchup.num_games > (10 * (finished - 1)) // matchup.num_games:
+            print(f'{(100 * finished) // matchup.num_games}% done - games completed: {finished}')
+        while played < matchup.num_games and done[played]:
+            if stopping is not None and duraks[played] is not None:
+                stopping.update(duraks[played] != loser)
+            played += 1
+            if stopping is not None and stopping.done():
+                break
+        if stopping is not None and stopping.done():
+            break # leaving the loop terminates the remaining games
+    draws = duraks[:played].count(None)
+    duraks = [d for d in duraks[:played] if d is not None]
+
+    if verbose:
+        wins = sum(d != loser for d in duraks)
+        low, high = wilsonInterval(wins, len(duraks))
+        line = f'win rate {wins / max(len(duraks), 1):.3f} [{low:.3f}, {high:.3f}] over {len(duraks)} games'
+        if draws > 0:
+            line += f' ({draws} cut off after {MAX_GAME_PLIES} plies)'
+        if stopping is not None:
+            line += f', {stopping.describe()}'
+        print(line)
+    return duraks
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Plays hybrid and MCTS agents against the heuristic and random agents.')
+    parser.add_argument('--iterations', type = int, nargs = '+', default = [10, 100], help = 'playouts per move of the MCTS agents')
+    parser.add_argument('--games', type = int, default = 20, help = 'games per matchup')
+    parser.add_argument('--players', type = int, default = 2, help = 'players per game')
+    parser.add_argument('--workers', type = int, default = None, help = 'worker processes (default: one per core)')
+    parser.add_argument('--seed', type = int, default = TOURNAMENT_SEED, help = 'seed of the first game')
+    parser.add_argument('--sprt', type = float, nargs = 2, metavar = ('P0', 'P1'), default = None,
+                        help = 'stop each matchup once an SPRT of win rate P0 against P1 is decided (--games is then the maximum)')
+    args = parser.parse_args()
+
+    matchups = []
+    for n in args.iterations:
+        matchups += [Matchup(HybridAgent(n), HeuristicAgent(), args.players, args.games),
+                     Matchup(MCTSAgent(n), RandomAgent(), args.players, args.games)]
+    start = time.perf_counter()
+    for matchup in matchups:
+        stopping = None if args.sprt is None else SPRT(*args.sprt)
+        duraks = matchupDuraks(matchup, args.seed, args.workers, verbose = False, stopping = stopping)
+        wins = sum(d != matchup.num_players - 1 for d in duraks)
+        low, high = wilsonInterval(wins, len(duraks))
+        line = f'{matchup.name}: win rate {wins / max(len(duraks), 1):.3f} [{low:.3f}, {high:.3f}] ({len(duraks)} games'
+        if stopping is not None:
+            line += f', {stopping.describe()}'
+        print(line + f', {time.perf_counter() - start:.1f}s elapsed)')
@@ -0,0 +1,150 @@
+from tournament import Matchup
+from tournament import HybridAgent
+from tournament import TOURNAMENT_SEED
+from sweep import runSweep
+from results import ResultStore
+from results import RESULTS_DIR
+import durak
+import search
+import itertools
+import argparse
+import random
+import math
+
+###################################################################
+#                       Global Constants                          #
+###################################################################
+
+# values tried for each tuned parameter. The first value of each list is the current default.
+PARAMETER_SPACE : dict[str, list] = {
+    'talon': [4, 2, 6, 8],                      # talon size at which the hybrid agent switches to MCTS (search.ENDGAME_TALON)
+    'talon_tolerance': [4, 2, 6],               # durak.TALON_TOLERANCE
+    'epsilon': [0.1, 0.0, 0.25],                # durak.EPSILON
+    'ucb_c': [math.sqrt(2), 0.5, 1.0, 2.0],     # search.UCB_C
+    'playout': ['heuristic', 'epsilon', 'random'], # search.PLAYOUT
+}
+
+TUNE_CONFIGS : int = 32 # number of configurations sampled from PARAMETER_SPACE
+TUNE_GAMES : int = 20 # games every configuration plays in the first round
+TUNE_ETA : int = 2 # each round keeps 1 / TUNE_ETA of the configurations and gives them TUNE_ETA times as many games
+TUNE_ITERATIONS : int = 100 # playouts per move of both the tuned and the baseline agent
+
+###################################################################
+#                           Tuned Agent                           #
+###################################################################
+
+class TunedAgent(HybridAgent):
+    def __init__(self, num_iterations : int, talon : int, talon_tolerance : int, epsilon : float, ucb_c : float, playout : str):
+        """
+        Hybrid agent whose heuristic and search constants are set while it chooses its moves (including inside its playouts),
+        and restored afterwards, so that other agents in the same process keep the defaults.
+
+        :param num_iterations: number of playouts MCTS does per move
+        :param talon: talon size at which MCTS takes over
+        :param talon_tolerance: value of durak.TALON_TOLERANCE
+        :param epsilon: value of durak.EPSILON
+        :param ucb_c: value of search.UCB_C
+        :param playout: value of search.PLAYOUT
+        """
+        super().__init__(num_iterations, talon)
+        self.talon_tolerance = talon_tolerance
+        self.epsilon = epsilon
+        self.ucb_c = ucb_c
+        self.playout = playout
+        self.name = f'tuned{num_iterations} ' + ' '.join(f'{k}={v:.3g}' if type(v) is float else f'{k}={v}' for k, v in self.parameters().items())
+
+
+    def parameters(self) -> dict:
+        return {'talon': self.talon, 'talon_tolerance': self.talon_tolerance, 'epsilon': self.epsilon, 'ucb_c': self.ucb_c, 'playout': self.playout}
+
+
+    def config(self) -> dict:
+        return {**super().config(), **self.parameters()}
+
+
+    def chooseAction(self, game : durak.TransferDurak) -> tuple:
+        defaults = (durak.TALON_TOLERANCE, durak.EPSILON, search.UCB_C, search.PLAYOUT)
+        durak.TALON_TOLERANCE, durak.EPSILON, search.UCB_C, search.PLAYOUT = self.talon_tolerance, self.epsilon, self.ucb_c, self.playout
+        try:
+            return super().chooseAction(game)
+        finally:
+            durak.TALON_TOLERANCE, durak.EPSILON, search.UCB_C, search.PLAYOUT = defaults
+
+###################################################################
+#                       Successive Halving                        #
+###################################################################
+
+def sampleConfigurations(num_configs : int, seed : int = 0) -> list[dict]:
+    """
+    Samples distinct parameter settings from PARAMETER_SPACE. The default setting is always included,
+    so the tuner reports whether anything beats it.
+
+    :param num_configs: number of settings, capped at the size of the grid
+    :param seed: seed of the sample
+    :rtype: list[dict]
+    """
+    names = list(PARAMETER_SPACE)
+    grid = list(itertools.product(*PARAMETER_SPACE.values()))
+    default = grid[0]
+    rng = random.Random(seed)
+    sample = [default] + rng.sample(grid[1:], min(num_configs, len(grid)) - 1)
+    return [dict(zip(names, values)) for values in sample]
+
+
+def successiveHalving(configs : list[dict], store : ResultStore, num_games : int = TUNE_GAMES, eta : int = TUNE_ETA,
+                      num_iterations : int = TUNE_ITERATIONS, num_players : int = 2, seed : int = TOURNAMENT_SEED, num_workers : int = None) -> list[dict]:
+    """
+    Plays every configuration against the default hybrid agent, then repeatedly keeps the best 1 / eta of them
+    and tops their matchups up to eta times as many games, until one configuration is left.
+    All games of a round are played in parallel, and every game is recorded in store, so an interrupted run resumes where it stopped.
+
+    :param configs: parameter settings (keyword arguments of TunedAgent, without num_iterations)
+    :param store: result store the games are recorded in
+    :param num_games: games per configuration in the first round
+    :param eta: elimination factor
+    :param num_iterations: playouts per move of both agents
+    :param num_players: players per game
+    :param seed: game i of every matchup is dealt with seed + i, so all configurations are compared on the same deals
+    :param num_workers: number of worker processes, or None for one per core
+    :return: store summaries of the final round's configurations, best first, each with a 'parameters' entry
+    :rtype: list[dict]
+    """
+    baseline = HybridAgent(num_iterations)
+    survivors = configs
+    games = num_games
+    round = 0
+    while True:
+        matchups = [Matchup(TunedAgent(num_iterations, **config), baseline, num_players, games) for config in survivors]
+        summaries = runSweep(matchups, store, seed, num_workers, run = 'tune', verbose = False)
+        for config, summary in zip(survivors, summaries):
+            summary['parameters'] = config
+        summaries.sort(key = lambda s: s['win_rate'], reverse = True)
+
+        print(f'round {round}: {len(survivors)} configurations, {games} games each')
+        for s in summaries:
+            print(f'\t{s["win_rate"]:.3f} [{s["win_rate_low"]:.3f}, {s["win_rate_high"]:.3f}] {s["parameters"]}')
+
+        if len(survivors) == 1:
+            return summaries
+        survivors = [s['parameters'] for s in summaries[:max(1, len(survivors) // eta)]]
+        games *= eta
+        round += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Tunes the hybrid agent by successive halving over PARAMETER_SPACE against the default hybrid agent.')
+    parser.add_argument('--configs', type = int, default = TUNE_CONFIGS, help = 'number of configurations sampled from the grid')
+    parser.add_argument('--games', type = int, default = TUNE_GAMES, help = 'games per configuration in the first round')
+    parser.add_argument('--eta', type = int, default = TUNE_ETA, help = 'elimination factor of successive halving')
+    parser.add_argument('--iterations', type = int, default = TUNE_ITERATIONS, help = 'playouts per move')
+    parser.add_argument('--players', type = int, default = 2, help = 'players per game')
+    parser.add_argument('--workers', type = int, default = None, help = 'worker processes (default: one per core)')
+    parser.add_argument('--seed', type = int, default = TOURNAMENT_SEED, help = 'seed of the configuration sample and of the first game')
+    parser.add_argument('--store', default = RESULTS_DIR, help = 'directory of the result store')
+    args = parser.parse_args()
+
+    with ResultStore(args.store) as store:
+        configs = sampleConfigurations(args.configs, args.seed)
+        best = successiveHalving(configs, store, args.games, args.eta, args.iterations, args.players, args.seed, args.workers)[0]
+    print(f'best: {best["parameters"]}, win rate against the default {best["win_rate"]:.3f} '
+          f'[{best["win_rate_low"]:.3f}, {best["win_rate_high"]:.3f}] over {best["games"]} games')
@@ -0,0 +1,257 @@
+from durak import TransferDurak
+from durak import runGame
+from durak import DEFAULT_CONFIG
+from durak import SUITS
+from durak import RANKS
+from durak import HAND_SIZE
+from search import ENDGAME_TALON
+import numpy as np
+import random
+
+###################################################################
+#                       Global Constants                          #
+###################################################################
+
+NUM_CARDS : int = SUITS * RANKS
+CARD_PLANES : int = 5 # own hand, known opponent cards, discard, attack cards, defense cards
+NUM_FEATURES : int = CARD_PLANES * NUM_CARDS + 5 # card planes + talon size, hand sizes, attacker flag, eating flag
+
+VALUE_FILE : str = 'value.npz' # default location of the trained value network
+
+###################################################################
+#                        Feature Encoding                         #
+###################################################################
+
+def cardIndex(state : TransferDurak, card) -> int:
+    """
+    Index of card in the feature encoding. Suits are relabelled so that the trump suit is always suit 0.
+
+    :param state: game the card belongs to
+    :type state: TransferDurak
+    :param card: card to index
+    :return: index in [0, NUM_CARDS)
+    :rtype: int
+    """
+    return ((card.suit - state.trump) % SUITS) * RANKS + card.rank
+
+
+def encodeState(state : TransferDurak) -> np.ndarray:
+    """
+    Encodes state from the perspective of the player to move, using only information that player can observe
+    (their own hand, their hand beliefs, and the public cards).
+
+    :param state: game state to encode
+    :type state: TransferDurak
+    :return: feature vector of length NUM_FEATURES
+    :rtype: np.ndarray
+    """
+    if state.config is not DEFAULT_CONFIG:
+        raise ValueError(f'the value network encodes games with the default deck, not {state.config}')
+    x = np.zeros(NUM_FEATURES)
+    player = state.getCurrentPlayer()
+    for card in player.hand:
+        x[cardIndex(state, card)] = 1.0
+    for i, belief in enumerate(player.hand_beliefs):
+        if state.players[i] is player:
+            continue
+        for card in belief:
+            x[NUM_CARDS + cardIndex(state, card)] = 1.0
+    for card in state.discard:
+        x[2 * NUM_CARDS + cardIndex(state, card)] = 1.0
+    for card in state.attack_cards:
+        x[3 * NUM_CARDS + cardIndex(state, card)] = 1.0
+    for card in state.defense_cards:
+        x[4 * NUM_CARDS + cardIndex(state, card)] = 1.0
+
+    # scalar features
+    opponent_cards = sum(len(p.hand) for p in state.players if p is not player)
+    offset = CARD_PLANES * NUM_CARDS
+    x[offset] = len(state.talon) / NUM_CARDS
+    x[offset + 1] = len(player.hand) / HAND_SIZE
+    x[offset + 2] = opponent_cards / (HAND_SIZE * (len(state.players) - 1))
+    x[offset + 3] = 1.0 if state.is_attacker_move else 0.0
+    x[offset + 4] = 1.0 if state.defender_eating else 0.0
+    return x
+
+###################################################################
+#                       Value Network Class                       #
+###################################################################
+
+class ValueNetwork:
+    def __init__(self, W1 : np.ndarray, b1 : np.ndarray, W2 : np.ndarray = None, b2 : np.ndarray = None):
+        """
+        Logistic regression (W2 is None) or a one hidden layer tanh MLP predicting the probability that the player to move is not the durak.
+
+        :param W1: first layer weights, shape (NUM_FEATURES, hidden) or (NUM_FEATURES, 1) for a linear model
+        :param b1: first layer bias
+        :param W2: output weights, shape (hidden, 1), or None for a linear model
+        :param b2: output bias, or None for a linear model
+        """
+        self.W1 = W1
+        self.b1 = b1
+        self.W2 = W2
+        self.b2 = b2
+
+
+    @classmethod
+    def random(cls, hidden_size : int = 32, seed : int = 0):
+        """
+        Returns a network with small random weights. hidden_size = 0 gives a linear model.
+
+        :param hidden_size: number of hidden units
+        :type hidden_size: int
+        :param seed: seed for the weight initialization
+        :type seed: int
+        """
+        rng = np.random.default_rng(seed)
+        if hidden_size == 0:
+            return cls(np.zeros((NUM_FEATURES, 1)), np.zeros(1))
+        W1 = rng.normal(0, 1 / np.sqrt(NUM_FEATURES), (NUM_FEATURES, hidden_size))
+        W2 = rng.normal(0, 1 / np.sqrt(hidden_size), (hidden_size, 1))
+        return cls(W1, np.zeros(hidden_size), W2, np.zeros(1))
+
+
+    @classmethod
+    def load(cls, path : str = VALUE_FILE):
+        """
+        Loads a network saved by ValueNetwork.save.
+
+        :param path: path to the .npz file
+        :type path: str
+        """
+        data = np.load(path)
+        if 'W2' in data:
+            return cls(data['W1'], data['b1'], data['W2'], data['b2'])
+        return cls(data['W1'], data['b1'])
+
+
+    def save(self, path : str = VALUE_FILE):
+        """
+        Saves the network weights to an .npz file.
+
+        :param path: path to the .npz file
+        :type path: str
+        """
+        if self.W2 is None:
+            np.savez(path, W1 = self.W1, b1 = self.b1)
+        else:
+            np.savez(path, W1 = self.W1, b1 = self.b1, W2 = self.W2, b2 = self.b2)
+
+
+    def forward(self, X : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Forward pass over a batch of feature vectors.
+
+        :param X: features, shape (batch, NUM_FEATURES)
+        :type X: np.ndarray
+        :return: the hidden activations (None for a linear model) and the predicted probabilities, shape (batch,)
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        if self.W2 is None:
+            return None, sigmoid(X @ self.W1 + self.b1)[:, 0]
+        H = np.tanh(X @ self.W1 + self.b1)
+        return H, sigmoid(H @ self.W2 + self.b2)[:, 0]
+
+
+    def evaluate(self, states : list[TransferDurak]) -> list[float]:
+        """
+        Leaf evaluator interface used by search.MCTS.
+
+        :param states: states to score
+        :type states: list[TransferDurak]
+        :return: for each state, the probability that the player to move is not the durak
+        :rtype: list[float]
+        """
+        X = np.stack([encodeState(state) for state in states])
+        _, p = self.forward(X)
+        return p.tolist()
+
+###################################################################
+#                      Self-Play and Training                     #
+###################################################################
+
+def sigmoid(z : np.ndarray) -> np.ndarray:
+    return 1 / (1 + np.exp(-z))
+
+
+def selfPlayData(num_games : int, seed : int = 0, max_talon : int = ENDGAME_TALON) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Plays chooseActionHeuristic self-play games and records every position with at most max_talon cards in the talon.
+
+    :param num_games: number of games to play
+    :type num_games: int
+    :param seed: seed of the first game. Game i uses seed + i
+    :type seed: int
+    :param max_talon: largest talon size of the recorded positions, or None to record every position
+    :return: features, shape (positions, NUM_FEATURES), and labels (1 if the player to move was not the durak)
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    X = []
+    y = []
+    for iter in range(num_games):
+        random.seed(seed + iter)
+        game = TransferDurak(num_players = 2, num_humans = 0)
+        features = []
+        movers = []
+
+        def agent(state : TransferDurak) -> tuple:
+            # records the positions to learn from before moving
+            if max_talon is None or len(state.talon) <= max_talon:
+                features.append(encodeState(state))
+                movers.append(state.getCurrentPlayerNumber())
+            return state.getCurrentPlayer().chooseActionHeuristic()
+
+        runGame(game, agent)
+
+        durak = game.player_numbers[0]
+        X += features
+        y += [1.0 if m != durak else 0.0 for m in movers]
+    return np.array(X).reshape(-1, NUM_FEATURES), np.array(y)
+
+
+def trainValueNetwork(X : np.ndarray, y : np.ndarray, hidden_size : int = 32, epochs : int = 30, learning_rate : float = 0.05,
+                      batch_size : int = 256, seed : int = 0) -> ValueNetwork:
+    """
+    Trains a ValueNetwork with minibatch gradient descent on the logistic loss.
+
+    :param X: features, shape (positions, NUM_FEATURES)
+    :param y: labels in {0, 1}
+    :param hidden_size: number of hidden units (0 for a linear model)
+    :param epochs: number of passes over the data
+    :param learning_rate: gradient descent step size
+    :param batch_size: minibatch size
+    :param seed: seed for initialization and shuffling
+    :rtype: ValueNetwork
+    """
+    rng = np.random.default_rng(seed)
+    net = ValueNetwork.random(hidden_size, seed)
+    for epoch in range(epochs):
+        order = rng.permutation(len(X))
+        for start in range(0, len(X), batch_size):
+            idx = order[start:start + batch_size]
+            Xb, yb = X[idx], y[idx]
+            H, p = net.forward(Xb)
+            dz = ((p - yb) / len(idx))[:, None] # gradient of the mean logistic loss wrt the output logit
+            if net.W2 is None:
+                net.W1 -= learning_rate * (Xb.T @ dz)
+                net.b1 -= learning_rate * dz.sum(axis = 0)
+            else:
+                dH = (dz @ net.W2.T) * (1 - H ** 2)
+                net.W2 -= learning_rate * (H.T @ dz)
+                net.b2 -= learning_rate * dz.sum(axis = 0)
+                net.W1 -= learning_rate * (Xb.T @ dH)
+                net.b1 -= learning_rate * dH.sum(axis = 0)
+    return net
+
+
+def accuracy(net : ValueNetwork, X : np.ndarray, y : np.ndarray) -> float:
+    _, p = net.forward(X)
+    return float(np.mean((p > 0.5) == (y > 0.5)))
+
+
+if __name__ == '__main__':
+    X, y = selfPlayData(2000)
+    X_test, y_test = selfPlayData(200, seed = 100000)
+    net = trainValueNetwork(X, y)
+    print(f'positions: {len(X)}, train accuracy: {accuracy(net, X, y):.3f}, test accuracy: {accuracy(net, X_test, y_test):.3f}')
+    net.save()